@@ -0,0 +1,199 @@
+"""
+Title: cache.py
+Content-hash helpers for the on-disk cache under data/02_cleaned/cache.
+
+A cache entry is named <name>-<key>.<suffix>, where the key hashes the bytes of
+every source file plus any options that change the cached result. When a source
+changes the key changes with it, so stale entries are never read back.
+
+Raw Excel/CSV sources go through read_excel / read_csv / sheet_names below:
+the first read of a sheet parses the file and stores it as Parquet, later
+reads load the Parquet copy. Column labels (which can be ints, e.g. year
+headers) and object columns holding mixed values (numbers next to "N.A.",
+dates next to free text) are stored losslessly, so a cached read returns the
+same frame as a fresh parse.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+import pickle
+import re
+from pathlib import Path
+from typing import List, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import CACHE_DIR
+
+CHUNK_SIZE = 1 << 20
+
+# Set to False to always parse raw files (the cache is still never read stale)
+RAW_CACHE = True
+# Bump when the on-disk layout of raw cache entries changes
+RAW_CACHE_VERSION = 1
+
+
+def source_files(path: Path) -> list[Path]:
+    """Every file that makes up a source: a directory's contents, or a
+    shapefile together with its .dbf/.shx/.prj sidecars."""
+    path = Path(path)
+    if path.is_dir():
+        return sorted(p for p in path.rglob("*") if p.is_file())
+    if path.suffix.lower() == ".shp":
+        return sorted(p for p in path.parent.glob(f"{path.stem}.*") if p.is_file())
+    return [path]
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 over the bytes (and relative names) of a source."""
+    path = Path(path)
+    h = hashlib.sha256()
+    for f in source_files(path):
+        h.update(f.name.encode())
+        with open(f, "rb") as fh:
+            for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(*paths: Path, **options) -> str:
+    """Short key combining source digests with the options used to read them."""
+    h = hashlib.sha256()
+    for p in paths:
+        h.update(file_digest(p).encode())
+    h.update(json.dumps(options, sort_keys=True, default=str).encode())
+    return h.hexdigest()[:16]
+
+
+def cache_path(name: str, key: str, suffix: str = ".parquet") -> Path:
+    return CACHE_DIR / f"{name}-{key}{suffix}"
+
+
+def temp_path(path: Path) -> Path:
+    """Per-process temp name next to `path`: write there, then os.replace onto `path`,
+    so concurrent stages writing the same entry never read or rename a partial file."""
+    return path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+
+def prune(name: str, keep: Path) -> None:
+    """Remove older entries of the same cache name once a new one is written.
+
+    Temp files are left alone: they may belong to another stage still writing.
+    """
+    for old in CACHE_DIR.glob(f"{name}-*"):
+        if old != keep and old.suffix != ".tmp":
+            old.unlink(missing_ok=True)
+
+
+# ------------------------------------------------------------
+# Raw sources: Excel sheets and CSVs cached as Parquet
+# ------------------------------------------------------------
+
+def _raw_name(path: Path, sheet: object = None) -> str:
+    stem = Path(path).stem if sheet is None else f"{Path(path).stem}_{sheet}"
+    return "raw_" + re.sub(r"[^A-Za-z0-9_.]+", "_", stem)
+
+
+def _pack(obj: object) -> str:
+    return base64.b64encode(pickle.dumps(obj)).decode()
+
+
+def _unpack(text: Union[str, bytes]) -> object:
+    return pickle.loads(base64.b64decode(text))
+
+
+def _write_frame(df: pd.DataFrame, path: Path) -> None:
+    """Parquet copy of a parsed frame: typed columns where possible, pickled cells
+    for object columns that mix types, original labels in the file metadata."""
+    out = pd.DataFrame(index=range(len(df)))
+    pickled = []
+    for i, (_, col) in enumerate(df.items()):
+        values = col.reset_index(drop=True)
+        if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) not in ("string", "empty"):
+            values = values.map(pickle.dumps)
+            pickled.append(i)
+        out[str(i)] = values
+
+    table = pa.Table.from_pandas(out, preserve_index=False)
+    meta = {
+        b"dmp.columns": _pack(list(df.columns)),
+        b"dmp.pickled": json.dumps(pickled),
+    }
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **meta})
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = temp_path(path)
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def _read_frame(path: Path) -> pd.DataFrame:
+    table = pq.read_table(path)
+    meta = table.schema.metadata
+    df = table.to_pandas()
+
+    for i in json.loads(meta[b"dmp.pickled"]):
+        df[str(i)] = df[str(i)].map(pickle.loads).astype(object)
+    for c in df.columns[df.dtypes == object]:
+        # Parquet returns None for missing strings; a fresh parse gives NaN
+        df[c] = df[c].where(df[c].notna(), float("nan"))
+
+    df.columns = _unpack(meta[b"dmp.columns"])
+    return df
+
+
+def _cached_read(name: str, key: str, parse) -> pd.DataFrame:
+    path = cache_path(name, key)
+    if RAW_CACHE and path.exists():
+        try:
+            return _read_frame(path)
+        except Exception as e:
+            print(f"[WARNING] Unreadable cache entry {path.name} ({e}); reparsing")
+
+    df = parse()
+    if RAW_CACHE:
+        if isinstance(df.index, pd.RangeIndex) and df.index.start == 0:
+            _write_frame(df, path)
+            prune(name, keep=path)
+        else:
+            print(f"[WARNING] Not caching {name}: only frames with a default index are cached")
+    return df
+
+
+def read_excel(path: Path, sheet_name: Union[str, int] = 0, **options) -> pd.DataFrame:
+    """pd.read_excel for one sheet, through the Parquet cache."""
+    key = cache_key(path, reader="excel", sheet=sheet_name, version=RAW_CACHE_VERSION, **options)
+    return _cached_read(
+        _raw_name(path, sheet_name), key,
+        lambda: pd.read_excel(path, sheet_name=sheet_name, **options),
+    )
+
+
+def read_csv(path: Path, **options) -> pd.DataFrame:
+    """pd.read_csv, through the Parquet cache."""
+    key = cache_key(path, reader="csv", version=RAW_CACHE_VERSION, **options)
+    return _cached_read(_raw_name(path), key, lambda: pd.read_csv(path, **options))
+
+
+def sheet_names(path: Path) -> List[str]:
+    """Sheet names of a workbook, cached alongside its sheets."""
+    key = cache_key(path, reader="sheets", version=RAW_CACHE_VERSION)
+    cached = cache_path(_raw_name(path, "sheets"), key, suffix=".json")
+    if RAW_CACHE and cached.exists():
+        return json.loads(cached.read_text())
+
+    with pd.ExcelFile(path) as xls:
+        names = list(xls.sheet_names)
+    if RAW_CACHE:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = temp_path(cached)
+        tmp.write_text(json.dumps(names))
+        os.replace(tmp, cached)
+        prune(_raw_name(path, "sheets"), keep=cached)
+    return names
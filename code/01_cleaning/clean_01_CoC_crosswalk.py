@@ -1,44 +1,220 @@
 import geopandas as gpd
-import fiona
+import hashlib
+import numpy as np
+import pandas as pd
+import pyogrio
+import shapely
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from config import COC_SHP, COUNTY_SHP, CROSSWALK
+from config import (COC_SHP, COC_VINTAGES, COUNTY_SHP, CROSSWALK, CROSSWALK_YEARS, COC_WEIGHTS,
+                    CROSSWALK_FAST, CROSSWALK_YEARS_FAST, COC_WEIGHTS_FAST, CROSSWALK_APPROX_REPORT,
+                    CACHE_DIR, YEARS)
+from cache import cache_key, cache_path, prune, temp_path
+from crosswalk_weights import area_shares, save_weights, load_weights, to_pairs
+from geography import county_fips_from_geoid, county_state, county_part
 import os
 
-def loading_and_cleaning():
-    import os
-    print("Exists:", os.path.exists(COC_SHP))
-    print("Is dir:", os.path.isdir(COC_SHP))
-    layers = fiona.listlayers(COC_SHP)
-    print("Loading data...")
+# ---------------------------------------------------------------------
+# SETTINGS
+# ---------------------------------------------------------------------
+
+# "indexed": STRtree candidate pairs per state, exact areas on a process pool
+# "overlay": single gpd.overlay of every county against every CoC (original path)
+OVERLAY_METHOD = "indexed"
+N_WORKERS = os.cpu_count()
+
+# Opt-in fast mode for iteration runs: snap to a precision grid and simplify
+# before intersecting. Units are meters (EPSG:5070). Fast runs write to the
+# *_FAST paths, never over the exact crosswalk later stages read.
+FAST_MODE = False
+GRID_SIZE = 100.0
+SIMPLIFY_TOLERANCE = 500.0
+
+CRS = 5070
+KEEP_COLS_COC = ["STATE_NAME", "COCNUM", "COCNAME"]
+KEEP_COLS_CTY = ["STATEFP", "COUNTYFP", "NAME", "GEOID"]
+
+# ------------------------------------------------------------
+# Loading
+# ------------------------------------------------------------
 
-    coc = gpd.read_file(COC_SHP, layer=layers[0], driver="OpenFileGDB").to_crs(epsg=5070)
-    cty = gpd.read_file(COUNTY_SHP).to_crs(5070)
-    print("Cleaning data...")
-    keep_cols_coc = ["STATE_NAME", "COCNUM", "COCNAME", "geometry"]
-    coc_clean = coc[keep_cols_coc].copy()
+def read_boundaries(path, columns, **kwargs):
+    """Arrow-backed read of only the attribute columns we keep (plus geometry)."""
+    return gpd.read_file(path, columns=columns, engine="pyogrio", use_arrow=True, **kwargs)
+
+
+def build_coc(path):
+    layer = pyogrio.list_layers(path)[0][0]
+    print(f"Loading CoC boundaries from {Path(path).name}...")
+
+    coc = read_boundaries(path, KEEP_COLS_COC, layer=layer).to_crs(epsg=CRS)
     # dissolving by same CoC to make sure each CoC is a single polygon
-    coc_clean = coc_clean.dissolve(
-        by=["STATE_NAME", "COCNUM", "COCNAME"],
+    return coc.dissolve(
+        by=KEEP_COLS_COC,
         as_index=False
     )
 
-    keep_cols_cty = ['STATEFP', 'COUNTYFP', 'NAME', 'GEOID', 'geometry']
-    cty_clean = cty[keep_cols_cty].copy()
-    cty_clean["county_fips5"] = cty_clean["GEOID"].astype(str).str.zfill(5)
-    cty_clean["statefips"] = cty_clean["county_fips5"].str[:2]
-    cty_clean["countyfips"] = cty_clean["county_fips5"].str[2:]
 
-    return coc_clean, cty_clean
+def build_counties():
+    print("Loading county boundaries...")
+    cty = read_boundaries(COUNTY_SHP, KEEP_COLS_CTY).to_crs(CRS)
+    return cty[KEEP_COLS_CTY + ["geometry"]].copy()
+
 
-def overlay(coc, cty):
-    # ---- Overlay intersections ----
-    print("[INFO] Computing intersections (county x CoC). This can take a bit.")
+def cached_boundaries(name, source, build, use_cache=True, **options):
+    """Reprojected, dissolved geometries are cached as GeoParquet, keyed by the source files."""
+    key = cache_key(source, crs=CRS, **options)
+    path = cache_path(name, key)
+
+    if use_cache and path.exists():
+        print(f"[INFO] Loading cached {name} ({key})")
+        return gpd.read_parquet(path)
+
+    gdf = build()
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = temp_path(path)
+    gdf.to_parquet(tmp)
+    os.replace(tmp, path)
+    prune(name, keep=path)
+    print(f"[INFO] Cached {name} to {path}")
+    return gdf
+
+
+def load_coc(path=COC_SHP, name="coc_boundaries", use_cache=True):
+    return cached_boundaries(name, path, lambda: build_coc(path), use_cache, cols=KEEP_COLS_COC)
+
+
+def load_counties(use_cache=True):
+    cty_clean = cached_boundaries("county_boundaries", COUNTY_SHP, build_counties, use_cache, cols=KEEP_COLS_CTY)
+    # Integer keys: county_fips = state * 1000 + county
+    cty_clean["county_fips"] = county_fips_from_geoid(cty_clean["GEOID"]).to_numpy()
+    cty_clean["statefips"] = county_state(cty_clean["county_fips"]).to_numpy()
+    cty_clean["countyfips"] = county_part(cty_clean["county_fips"]).to_numpy()
+    return cty_clean
+
+
+def loading_and_cleaning(use_cache=True):
+    print("Loading data...")
+    return load_coc(use_cache=use_cache), load_counties(use_cache=use_cache)
+
+# ------------------------------------------------------------
+# Fast mode: reduced-precision geometries
+# ------------------------------------------------------------
+
+def approximate(gdf, grid_size=GRID_SIZE, tolerance=SIMPLIFY_TOLERANCE):
+    """Simplify, then snap vertices to a grid_size grid."""
+    geoms = shapely.simplify(gdf.geometry.to_numpy(), tolerance, preserve_topology=True)
+    geoms = shapely.set_precision(geoms, grid_size)
+    return gdf.set_geometry(gpd.GeoSeries(geoms, index=gdf.index, crs=gdf.crs))
+
+
+def approximation_report(exact_path, approx_path):
+    """Per-county comparison of approximate vs exact assignments and area shares."""
+    def area_pairs(path):
+        counties, cocs, matrices = load_weights(path)
+        return to_pairs(counties, cocs, matrices["area"])
+
+    exact = area_pairs(exact_path)
+    approx = area_pairs(approx_path)
+
+    pairs = exact.merge(approx, on=["county_fips", "coc_id"], how="outer",
+                        suffixes=("_exact", "_approx")).fillna({"share_exact": 0.0, "share_approx": 0.0})
+    pairs["share_diff"] = (pairs["share_approx"] - pairs["share_exact"]).abs()
+
+    def winner(col):
+        idx = pairs.groupby("county_fips")[col].idxmax()
+        return pairs.loc[idx].set_index("county_fips")[["coc_id", col]]
+
+    report = (
+        winner("share_exact").rename(columns={"coc_id": "coc_exact"})
+        .join(winner("share_approx").rename(columns={"coc_id": "coc_approx"}), how="outer")
+        .join(pairs.groupby("county_fips")["share_diff"].max().rename("max_share_diff"))
+        .reset_index()
+    )
+    report["same_assignment"] = report["coc_exact"] == report["coc_approx"]
+    return report
+
+
+# ------------------------------------------------------------
+# Intersections: original overlay path
+# ------------------------------------------------------------
+
+def overlay_intersections(coc, cty):
     inter = gpd.overlay(
-        cty[["county_fips5", "statefips", "countyfips", "geometry"]],
+        cty[["county_fips", "statefips", "countyfips", "geometry"]],
         coc[["COCNUM", "geometry"]],
         how="intersection"
     )
+    inter["int_area"] = inter.geometry.area
+    return pd.DataFrame(inter.drop(columns="geometry"))
+
+# ------------------------------------------------------------
+# Intersections: spatial-index path
+# ------------------------------------------------------------
+
+def intersect_partition(cty_part, coc_part):
+    """Exact intersection areas for the county/CoC pairs whose geometries touch."""
+    cty_geoms = cty_part.geometry.to_numpy()
+    coc_geoms = coc_part.geometry.to_numpy()
+
+    # Candidate pairs from the bounding-box tree, refined to true intersections
+    tree = shapely.STRtree(coc_geoms)
+    cty_idx, coc_idx = tree.query(cty_geoms, predicate="intersects")
+
+    int_area = shapely.area(shapely.intersection(cty_geoms[cty_idx], coc_geoms[coc_idx]))
 
+    out = pd.DataFrame({
+        "county_fips": cty_part["county_fips"].to_numpy()[cty_idx],
+        "statefips": cty_part["statefips"].to_numpy()[cty_idx],
+        "countyfips": cty_part["countyfips"].to_numpy()[cty_idx],
+        "COCNUM": coc_part["COCNUM"].to_numpy()[coc_idx],
+        "int_area": int_area,
+    })
+
+    # Boundary-only contacts have zero area; overlay drops them too
+    return out[out["int_area"] > 0]
+
+
+def partition_by_state(coc, cty):
+    """Split counties by state and pair each state with the CoCs near its extent."""
+    coc_tree = shapely.STRtree(coc.geometry.to_numpy())
+
+    for _, cty_part in cty.groupby("statefips", sort=True):
+        extent = shapely.box(*cty_part.total_bounds)
+        coc_part = coc.iloc[np.sort(coc_tree.query(extent))]
+        if len(coc_part):
+            yield cty_part, coc_part
+
+
+def indexed_intersections(coc, cty, n_workers=N_WORKERS):
+    cty = cty[["county_fips", "statefips", "countyfips", "geometry"]]
+    coc = coc[["COCNUM", "geometry"]].reset_index(drop=True)
+
+    parts = list(partition_by_state(coc, cty))
+    if not parts:
+        return pd.DataFrame(columns=["county_fips", "statefips", "countyfips", "COCNUM", "int_area"])
+    cty_parts = [p[0] for p in parts]
+    coc_parts = [p[1] for p in parts]
+
+    if n_workers is None or n_workers <= 1:
+        results = list(map(intersect_partition, cty_parts, coc_parts))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(intersect_partition, cty_parts, coc_parts))
+
+    return pd.concat(results, ignore_index=True)
+
+
+def intersections(coc, cty, method=OVERLAY_METHOD, n_workers=N_WORKERS):
+    print(f"[INFO] Computing intersections ({len(coc)} CoCs x counties, method={method}). This can take a bit.")
+    if method == "overlay":
+        return overlay_intersections(coc, cty)
+    if method == "indexed":
+        return indexed_intersections(coc, cty, n_workers=n_workers)
+    raise ValueError(f"Unknown overlay method: {method!r}")
+
+
+def check_intersections(inter, coc, cty):
     if len(inter) == 0:
         # Helpful debugging info
         print("[ERROR] Overlay returned 0 intersections.")
@@ -46,12 +222,14 @@ def overlay(coc, cty):
         print("County bounds:", cty.total_bounds)
         raise RuntimeError("No intersections found. Likely CRS or geometry mismatch.")
 
-    inter["int_area"] = inter.geometry.area
+
+def write_crosswalk(inter, fast=FAST_MODE):
+    crosswalk, weights = (CROSSWALK_FAST, COC_WEIGHTS_FAST) if fast else (CROSSWALK, COC_WEIGHTS)
 
     # ---- Choose 1-to-1 mapping: largest overlap area ----
     # For each county, keep the CoC with max intersection area
-    inter_sorted = inter.sort_values(["county_fips5", "int_area"], ascending=[True, False])
-    best = inter_sorted.groupby("county_fips5", as_index=False).first()
+    inter_sorted = inter.sort_values(["county_fips", "int_area"], ascending=[True, False])
+    best = inter_sorted.groupby("county_fips", as_index=False).first()
 
     # ---- Output exactly the columns you want ----
     out = best[["statefips", "countyfips", "COCNUM"]].copy()
@@ -59,18 +237,117 @@ def overlay(coc, cty):
 
     # Sanity checks
     print("[INFO] Output rows:", len(out))
-    print("[INFO] Unique counties:",
-          out["statefips"].astype(str).str.zfill(2).add(out["countyfips"].astype(str).str.zfill(3)).nunique())
+    print("[INFO] Unique counties:", best["county_fips"].nunique())
     print("[INFO] Example rows:\n", out.head())
 
     # Save
-    out.to_csv(CROSSWALK, index=False)
-    print(f"[DONE] Wrote crosswalk to: {CROSSWALK}")
+    out.to_csv(crosswalk, index=False)
+    print(f"[DONE] Wrote crosswalk to: {crosswalk}")
+
+    # ---- Keep every overlap as a sparse county x CoC area-share matrix ----
+    counties, cocs, shares = area_shares(inter)
+    save_weights(weights, counties, cocs, area=shares)
+    print(f"[DONE] Wrote {shares.nnz} county-CoC weights to: {weights}")
+
+    # The exact weights are the reference for fast-mode runs
+    if fast and COC_WEIGHTS.exists():
+        report = approximation_report(COC_WEIGHTS, COC_WEIGHTS_FAST)
+        report.to_csv(CROSSWALK_APPROX_REPORT, index=False)
+        print("[INFO] Fast mode vs exact crosswalk:")
+        print("  Counties with same CoC assignment:",
+              f"{report['same_assignment'].sum()} / {len(report)} ({report['same_assignment'].mean():.2%})")
+        print(f"  Max area-share difference: {report['max_share_diff'].max():.4f}")
+        print(f"  Mean area-share difference: {report['max_share_diff'].mean():.4f}")
+        print(f"[DONE] Wrote approximation report to: {CROSSWALK_APPROX_REPORT}")
+    elif fast:
+        print("[WARNING] No exact crosswalk to compare against; run once with fast=False first.")
+
+# ------------------------------------------------------------
+# Boundary vintages: incremental rebuilds keyed by CoC geometry
+# ------------------------------------------------------------
+
+def geometry_hashes(geoms):
+    """Stable per-CoC key: SHA-256 of the normalized 2D WKB geometry."""
+    wkb = shapely.to_wkb(shapely.normalize(geoms.to_numpy()), output_dimension=2)
+    return [hashlib.sha256(b).hexdigest()[:16] for b in wkb]
+
+
+def incremental_intersections(coc, cty, pairs, method=OVERLAY_METHOD, n_workers=N_WORKERS):
+    """Intersect only CoCs whose geometry is not already in the pair cache.
+
+    pairs holds one row per (geom_hash, county) overlap from earlier runs and
+    vintages; it is returned with the newly computed rows appended.
+    """
+    coc = coc.assign(geom_hash=geometry_hashes(coc.geometry))
+    new = coc[~coc["geom_hash"].isin(pairs["geom_hash"])].drop_duplicates("geom_hash")
+    print(f"[INFO] {len(new)} of {len(coc)} CoC geometries changed or new; reusing cached rows for the rest")
+
+    if len(new):
+        inter = intersections(new.assign(COCNUM=new["geom_hash"]), cty, method=method, n_workers=n_workers)
+        pairs = pd.concat([pairs, inter.rename(columns={"COCNUM": "geom_hash"})], ignore_index=True)
+
+    inter = coc[["COCNUM", "geom_hash"]].merge(pairs, on="geom_hash")
+    return inter, pairs
+
+
+def year_crosswalk(vintage_inter, years=YEARS):
+    """Year-indexed crosswalk: all county/CoC overlaps with area shares and the largest-overlap flag."""
+    vintages = sorted(vintage_inter)
+    frames = []
+    for year in years:
+        vintage = max([v for v in vintages if v <= year], default=vintages[0])
+        frames.append(vintage_inter[vintage].assign(year=year, vintage=vintage))
+    df = pd.concat(frames, ignore_index=True)
+
+    df = df.groupby(["year", "vintage", "county_fips", "statefips", "countyfips", "COCNUM"],
+                    as_index=False)["int_area"].sum()
+    df["area_share"] = df["int_area"] / df.groupby(["year", "county_fips"])["int_area"].transform("sum")
+    best = df.groupby(["year", "county_fips"])["int_area"].idxmax()
+    df["largest"] = df.index.isin(best).astype(int)
+
+    df = df.rename(columns={"COCNUM": "coc_id"})
+    return df[["year", "vintage", "statefips", "countyfips", "coc_id", "area_share", "largest"]]
+
+
+def main(method=OVERLAY_METHOD, fast=FAST_MODE, vintages=COC_VINTAGES):
+    cty = load_counties()
+    if fast:
+        print(f"[INFO] Fast mode: grid={GRID_SIZE}m, simplify={SIMPLIFY_TOLERANCE}m")
+        cty = approximate(cty)
+
+    # Pair cache is only valid for this county layer and precision setting
+    pairs_key = cache_key(COUNTY_SHP, crs=CRS, fast=fast, grid=GRID_SIZE, tol=SIMPLIFY_TOLERANCE, keys="int")
+    pairs_path = cache_path("coc_pairs", pairs_key)
+    pairs = (pd.read_parquet(pairs_path) if pairs_path.exists()
+             else pd.DataFrame(columns=["geom_hash", "county_fips", "statefips", "countyfips", "int_area"]))
+
+    vintage_inter = {}
+    hashes_in_use = set()
+    for vintage, path in sorted(vintages.items()):
+        print(f"\n[INFO] CoC boundary vintage {vintage}")
+        coc = load_coc(path, name=f"coc_boundaries_{vintage}")
+        if fast:
+            coc = approximate(coc)
+        inter, pairs = incremental_intersections(coc, cty, pairs, method=method)
+        check_intersections(inter, coc, cty)
+        vintage_inter[vintage] = inter
+        hashes_in_use.update(inter["geom_hash"])
+
+    # Keep only geometries referenced by a configured vintage
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = temp_path(pairs_path)
+    pairs[pairs["geom_hash"].isin(hashes_in_use)].to_parquet(tmp, index=False)
+    os.replace(tmp, pairs_path)
+    prune("coc_pairs", keep=pairs_path)
+
+    # Current boundaries -> coc_county_crosswalk.csv and the sparse weights
+    write_crosswalk(vintage_inter[max(vintage_inter)], fast=fast)
 
-def main():
-    coc, cty = loading_and_cleaning()
-    overlay(coc, cty)
+    years_path = CROSSWALK_YEARS_FAST if fast else CROSSWALK_YEARS
+    years = year_crosswalk(vintage_inter)
+    years.to_csv(years_path, index=False)
+    print(f"[DONE] Wrote year-indexed crosswalk ({years['year'].min()}-{years['year'].max()}) to: {years_path}")
     print("[DONE]")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
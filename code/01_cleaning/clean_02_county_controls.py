@@ -2,247 +2,200 @@ import os
 import requests
 import pandas as pd
 from pathlib import Path
-from config import COUNTY_CLEAN, UNEMP, UNEMP, COUNTY_POP_2020s, COUNTY_POP_2010s, COVID, CROSSWALK, COVARIATES
+from config import COUNTY_CLEAN, UNEMP, UNEMP, COUNTY_POP_2020s, COUNTY_POP_2010s, COVID, CROSSWALK, CROSSWALK_YEARS, COVARIATES, COC_POP_WEIGHTS, YEARS
 import time
 from tqdm import tqdm
 import numpy as np
+from scipy import sparse
+from crosswalk_weights import from_pairs_by, population_shares, aggregate, save_weights
+from laus import read_laus_years
+from covid import covid_county_year
+from cache import read_csv
+from geography import county_fips, coc_categorical
+from schema import compact, read_csv as read_schema_csv, write_csv
 
-def add_population_data(): 
-    pop20 = pd.read_csv(COUNTY_POP_2020s, encoding="latin-1")
-    pop10 = pd.read_csv(COUNTY_POP_2010s, encoding="latin-1")
+# -----------------------------
+# SETTINGS
+# -----------------------------
 
-    keepcols10 = ["STATE", "COUNTY", "STNAME", "CTYNAME", "POPESTIMATE2016", "POPESTIMATE2017", "POPESTIMATE2018", 
-                  "POPESTIMATE2019"]
-    keepcols20 = ["STATE", "COUNTY", "POPESTIMATE2020", "POPESTIMATE2021", "POPESTIMATE2022", "POPESTIMATE2023"]
+# "largest": each county goes wholly to the CoC with the largest overlap in that year's boundaries
+# "fractional": counties split across CoCs are allocated by area share
+# Both come from the year-indexed crosswalk (coc_county_crosswalk_years.csv)
+ALLOCATION = "largest"
 
-    pop20 = pop20[keepcols20]
-    pop10 = pop10[keepcols10]
+# CoC covariates: totals of SUM_VARS, and weighted means of each WEIGHTED_VARS
+# key using its value as the weight (UNEMP weighted by POP)
+SUM_VARS = ["POP", "COVID_cases", "COVID_deaths"]
+WEIGHTED_VARS = {"UNEMP": "POP"}
 
-    pop20["STATE"] = pop20["STATE"].astype(str).str.zfill(2)
-    pop20["COUNTY"] = pop20["COUNTY"].astype(str).str.zfill(3)
-    pop10["STATE"] = pop10["STATE"].astype(str).str.zfill(2)
-    pop10["COUNTY"] = pop10["COUNTY"].astype(str).str.zfill(3)
+KEYS = ["county_fips", "year"]
 
-    pop20 = pop20.rename(columns={'STATE': 'statefips', 'COUNTY': 'countyfips', 'POPESTIMATE2020': 'POP_2020', 
-                                  'POPESTIMATE2021': 'POP_2021', 'POPESTIMATE2022': 'POP_2022', 'POPESTIMATE2023': 'POP_2023'})
-    pop10 = pop10.rename(columns={'STATE': 'statefips', 'COUNTY': 'countyfips', 'POPESTIMATE2016': 'POP_2016', 
-                                  'POPESTIMATE2017': 'POP_2017', 'POPESTIMATE2018': 'POP_2018', 'POPESTIMATE2019': 'POP_2019'})
+# -----------------------------
+# COUNTY-YEAR SOURCES (long, indexed by county_fips x year)
+# -----------------------------
 
-    df = pd.read_csv(CROSSWALK)
-    df_ = df.copy()
-    df["statefips"] = df["statefips"].astype(str).str.zfill(2)
-    df["countyfips"] = df["countyfips"].astype(str).str.zfill(3)
-    df = pd.merge(df, pop10, on=['statefips', 'countyfips'], how='left')
-    df = pd.merge(df, pop20, on=['statefips', 'countyfips'], how='left')
+def population_data(years=YEARS):
+    frames = []
+    for path in [COUNTY_POP_2010s, COUNTY_POP_2020s]:
+        pop = read_csv(path, encoding="latin-1")
+        est_cols = [f"POPESTIMATE{year}" for year in years if f"POPESTIMATE{year}" in pop.columns]
 
-    n_unmatched = df["POP_2021"].isna().sum()
-    print("Counties rows with no match in population:", n_unmatched)
+        pop["county_fips"] = county_fips(pop["STATE"], pop["COUNTY"])
+        pop = pop.melt(id_vars="county_fips", value_vars=est_cols, var_name="year", value_name="POP")
+        pop["year"] = pop["year"].str[len("POPESTIMATE"):].astype(int)
+        frames.append(pop)
 
-    return df
-
-def clean_unemployment_data(path, sheetname, year):
-    df = pd.read_excel(path, sheet_name=sheetname, skiprows=1)
-    # Example cleaning steps (these would depend on the actual data format)
-    df = df.rename(columns={"State FIPS Code": "statefips", "County FIPS Code": "countyfips", 
-                            "Unemployment Rate (%)": f"UNEMP_{year}"})
-    df["statefips"] = df["statefips"].fillna(0).astype(int)
-    df["countyfips"] = df["countyfips"].fillna(0).astype(int)
-    df["statefips"] = df["statefips"].astype(str).str.zfill(2)
-    df["countyfips"] = df["countyfips"].astype(str).str.zfill(3)
-    return df[["statefips", "countyfips", f"UNEMP_{year}"]]
-
-
-def add_unemployment_data(df):
-    unemp_2016 = clean_unemployment_data(UNEMP / "laucnty16.xlsx", "laucnty16", 2016)
-    unemp_2017 = clean_unemployment_data(UNEMP / "laucnty17.xlsx", "laucnty17", 2017)
-    unemp_2018 = clean_unemployment_data(UNEMP / "laucnty18.xlsx", "laucnty18", 2018)
-    unemp_2019 = clean_unemployment_data(UNEMP / "laucnty19.xlsx", "laucnty19", 2019)
-    unemp_2020 = clean_unemployment_data(UNEMP / "laucnty20.xlsx", "laucnty20", 2020)
-    unemp_2021 = clean_unemployment_data(UNEMP / "laucnty21.xlsx", "laucnty21", 2021)
-    unemp_2022 = clean_unemployment_data(UNEMP / "laucnty22.xlsx", "laucnty22", 2022)
-    unemp_2023 = clean_unemployment_data(UNEMP / "laucnty23.xlsx", "laucnty23", 2023)
-    df["statefips"] = df["statefips"].astype(str).str.zfill(2)
-    df["countyfips"] = df["countyfips"].astype(str).str.zfill(3)
-    df = pd.merge(df, unemp_2016, on=['statefips', 'countyfips'], how='left')
-    df = pd.merge(df, unemp_2017, on=['statefips', 'countyfips'], how='left')
-    df = pd.merge(df, unemp_2018, on=['statefips', 'countyfips'], how='left')
-    df = pd.merge(df, unemp_2019, on=['statefips', 'countyfips'], how='left')   
-    df = pd.merge(df, unemp_2020, on=['statefips', 'countyfips'], how='left')
-    df = pd.merge(df, unemp_2021, on=['statefips', 'countyfips'], how='left')
-    df = pd.merge(df, unemp_2022, on=['statefips', 'countyfips'], how='left')
-    df = pd.merge(df, unemp_2023, on=['statefips', 'countyfips'], how='left')
-    return df
-
-def clean_covid_data(path, year):
-    """
-    Read NYT us-counties-YYYY.csv and return annual totals by county FIPS (GEOID).
+    # Later estimate vintages win where the two files overlap
+    pop = pd.concat(frames, ignore_index=True).drop_duplicates(KEYS, keep="last")
+    return pop.set_index(KEYS)
 
-    Assumption (NYT yearly files): 'cases' and 'deaths' are cumulative within the year.
-    Therefore, max(cases) in that file = total cases during that year.
-    """
-    df = pd.read_csv(path, dtype={"fips": "Int64"})
 
-    # Keep only what we need
-    df = df.rename(columns={"fips": "GEOID"})
-    df = df[["GEOID", "cases", "deaths"]].copy()
+def unemployment_data(years=YEARS):
+    # All LAUS workbooks in UNEMP, parsed concurrently into one long table
+    laus = read_laus_years(UNEMP, years=years)
+    laus["county_fips"] = county_fips(laus["statefips"], laus["countyfips"])
+    return laus.rename(columns={"unemp_rate": "UNEMP"}).set_index(KEYS)[["UNEMP"]]
 
-    # Drop rows without a county FIPS (NYT has some NaNs for "Unknown" etc.)
-    df = df.dropna(subset=["GEOID"])
 
-    # Standardize GEOID as 5-char string
-    df["GEOID"] = df["GEOID"].astype(int).astype(str).str.zfill(5)
+def covid_data(covid_dir, years=YEARS):
+    """Annual county-level COVID cases/deaths for every year with an NYT file."""
+    covid = covid_county_year(covid_dir)
+    return covid[covid["year"].isin(years)].set_index(KEYS)
 
-    # End-of-year totals (within-year cumulative)
-    df = df.groupby("GEOID", as_index=False)[["cases", "deaths"]].max()
 
-    # Rename to annual totals columns
-    df = df.rename(columns={
-        "cases": f"COVID_cases_{year}",
-        "deaths": f"COVID_deaths_{year}"
-    })
+def county_covariates(years=YEARS):
+    """
+    One long county x year table: every source is built in long form and
+    joined once onto the crosswalk counties on integer (county_fips, year) keys.
+    """
+    counties = read_schema_csv(CROSSWALK)
+    counties["county_fips"] = county_fips(counties["statefips"], counties["countyfips"])
 
-    return df
+    skeleton = pd.MultiIndex.from_product([counties["county_fips"], list(years)], names=KEYS)
+    sources = pd.concat([population_data(years), unemployment_data(years), covid_data(COVID, years)], axis=1)
+    df = sources.reindex(skeleton).reset_index()
 
+    n_unmatched = df.loc[df["year"] == max(years), "POP"].isna().sum()
+    print("Counties rows with no match in population:", n_unmatched)
 
-def add_covid_data(df, covid_dir):
-    """
-    Add annual county-level COVID cases/deaths to df using GEOID merge.
-    Produces COVID_cases_YYYY and COVID_deaths_YYYY for YYYY=2020..2023 plus zeros for 2016..2019.
-    """
-    # Build county GEOID in your main df
-    df = df.copy()
-    df["GEOID"] = (
-        df["statefips"].astype(str).str.zfill(2)
-        + df["countyfips"].astype(str).str.zfill(3)
-    )
+    # Counties missing from NYT file, and pre-COVID years -> treat as 0
+    df[["COVID_cases", "COVID_deaths"]] = df[["COVID_cases", "COVID_deaths"]].fillna(0)
 
-    # Merge annual totals (2020-2023)
-    for year in [2020, 2021, 2022, 2023]:
-        covid_year = clean_covid_data(covid_dir / f"us-counties-{year}.csv", year)
-        df = df.merge(covid_year, on="GEOID", how="left")
+    df = counties[["county_fips", "statefips", "countyfips", "coc_id"]].merge(df, on="county_fips")
+    return compact(df, "county_covariates")
 
-        # Counties missing from NYT file -> treat as 0
-        df[f"COVID_cases_{year}"] = df[f"COVID_cases_{year}"].fillna(0)
-        df[f"COVID_deaths_{year}"] = df[f"COVID_deaths_{year}"].fillna(0)
+# -----------------------------
+# AGGREGATION TO CoC
+# -----------------------------
 
-    # Add pre-COVID years explicitly as zeros
-    for year in [2016, 2017, 2018, 2019]:
-        df[f"COVID_cases_{year}"] = 0
-        df[f"COVID_deaths_{year}"] = 0
+def load_allocation(years, allocation=ALLOCATION):
+    """Per-year county x CoC weight matrices, joined to the crosswalk by HUD year."""
+    cw = read_schema_csv(CROSSWALK_YEARS)
+    cw["county_fips"] = county_fips(cw["statefips"], cw["countyfips"])
+    cw["coc_id"] = coc_categorical(cw["coc_id"])
 
-    # Optionally drop GEOID if you don't need it downstream
-    df = df.drop(columns=["GEOID"])
+    if allocation == "largest":
+        cw["weight"] = cw["largest"].astype(float)
+    elif allocation == "fractional":
+        cw["weight"] = cw["area_share"]
+    else:
+        raise ValueError(f"Unknown allocation: {allocation!r}")
 
-    return df
+    cw = cw[(cw["weight"] > 0) & cw["year"].isin(years)]
+    missing = sorted(set(years) - set(cw["year"]))
+    if missing:
+        raise KeyError(f"No crosswalk rows for years {missing}; rerun stage 1 with these YEARS.")
 
-def collapsing_by_coc(df):
+    counties, cocs, matrices = from_pairs_by(cw, "weight", by="year")
+    return counties, cocs, [matrices[year] for year in years]
 
-    # ------------------------------------------------------------
-    # Drop unused geographic columns
-    # ------------------------------------------------------------
-    cols_to_drop = ['statefips', 'countyfips', 'STNAME', 'CTYNAME']
-    df = df.drop(columns=[c for c in cols_to_drop if c in df.columns])
 
-    # ------------------------------------------------------------
-    # Clean numeric types
-    # ------------------------------------------------------------
-    for col in df.columns:
-        if col.startswith(('POP_', 'COVID_')):
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-        elif col.startswith('UNEMP_'):
-            df[col] = pd.to_numeric(
-                df[col].replace('N.A.', np.nan),
-                errors='coerce'
-            )
+def county_values(df, counties, years):
+    """County-year rows stacked year by year, aligned to the weight matrix rows."""
+    rows = pd.MultiIndex.from_product([years, counties], names=["year", "county_fips"])
+    return df.set_index(["year", "county_fips"]).reindex(rows)
 
-    # ------------------------------------------------------------
-    # Identify year suffixes dynamically
-    # ------------------------------------------------------------
-    pop_cols = sorted([c for c in df.columns if c.startswith('POP_')])
-    years = sorted([c.split('_')[1] for c in pop_cols])
 
-    # ------------------------------------------------------------
-    # Aggregate POP and COVID by sum
-    # ------------------------------------------------------------
-    sum_cols = [c for c in df.columns if c.startswith(('POP_', 'COVID_'))]
-    df_sum = df.groupby("coc_id", as_index=False)[sum_cols].sum()
+def collapsing_by_coc(df, allocation=ALLOCATION, sum_vars=SUM_VARS, weighted_vars=WEIGHTED_VARS):
+
+    years = sorted(df["year"].unique())
+    counties, cocs, weights = load_allocation(years, allocation)
+    df = county_values(df, counties, years)
 
     # ------------------------------------------------------------
-    # Population-weighted unemployment
+    # Columns to total: summed variables, weighting variables, and
+    # one weighted numerator (var x weight) per weighted variable
     # ------------------------------------------------------------
-    for year in years:
-        pop_col = f'POP_{year}'
-        unemp_col = f'UNEMP_{year}'
-
-        # Create weighted numerator at county level
-        df[f'_weighted_unemp_{year}'] = (
-            (df[unemp_col] / 100) * df[pop_col]
-        )
-
-        # Sum numerator by CoC
-        num = (
-            df.groupby("coc_id")[f'_weighted_unemp_{year}']
-              .sum()
-              .reset_index(name=f'_num_{year}')
-        )
-
-        df_sum = df_sum.merge(num, on="coc_id", how="left")
-
-        # Compute weighted unemployment
-        df_sum[f'UNEMP_{year}'] = (
-            df_sum[f'_num_{year}'] / df_sum[pop_col]
-        ) * 100
-
-        df_sum = df_sum.drop(columns=[f'_num_{year}'])
-    
-    print("Columns after aggregation:")
-    print(df_sum.columns)
+    weight_vars = sorted(set(weighted_vars.values()))
+    total_cols = list(dict.fromkeys(sum_vars + weight_vars))
+    num_cols = [f"_num_{var}" for var in weighted_vars]
+
+    values = np.column_stack(
+        [df[total_cols].to_numpy(dtype=float)]
+        + [(df[var] * df[w]).to_numpy(dtype=float) for var, w in weighted_vars.items()]
+    )
 
     # ------------------------------------------------------------
-    # NOW RESHAPE TO LONG
+    # One grouped pass: every (year, county) row x every column against
+    # the per-year weights in a single sparse product
     # ------------------------------------------------------------
-    value_cols = (
-        [c for c in df_sum.columns if c.startswith("POP_")] +
-        [c for c in df_sum.columns if c.startswith("COVID_")] +
-        [c for c in df_sum.columns if c.startswith("UNEMP_")]
-    )
+    totals = aggregate(sparse.block_diag(weights, format="csr"), values)
 
-    df_long = df_sum.melt(
-        id_vars="coc_id",
-        value_vars=value_cols,
-        var_name="variable",
-        value_name="value"
-    )
+    df_long = pd.DataFrame(totals, columns=total_cols + num_cols)
+    df_long.insert(0, "coc_id", np.tile(cocs, len(years)))
+    df_long.insert(1, "year", np.repeat(years, len(cocs)))
 
-    df_long[["var", "year"]] = df_long["variable"].str.rsplit("_", n=1, expand=True)
-    df_long["year"] = df_long["year"].astype(int)
+    # Only keep CoCs that receive some county in that year
+    received = np.concatenate([np.asarray(w.sum(axis=0)).ravel() > 0 for w in weights])
+    df_long = df_long[received]
 
+    # Weighted means; the denominator is the full weight total, so counties
+    # with a missing value count as zero (as in the original per-year loop)
+    for var, w in weighted_vars.items():
+        df_long[var] = df_long[f"_num_{var}"] / df_long[w]
+
+    out_vars = sorted(set(sum_vars) | set(weighted_vars))
     df_long = (
-        df_long
-        .pivot(index=["coc_id","year"], columns="var", values="value")
-        .reset_index()
+        df_long[["coc_id", "year"] + out_vars]
+        .sort_values(["coc_id", "year"])
+        .reset_index(drop=True)
     )
 
-    # Now this WILL work
+    print("Columns after aggregation:")
+    print(df_long.columns)
+
     covid_vars = [c for c in df_long.columns if c.startswith("COVID")]
     df_long.loc[df_long["year"] < 2020, covid_vars] = 0
 
     return df_long
 
 
+def save_population_weights(df, allocation=ALLOCATION):
+    """Population-share counterpart of the area-share weights, one matrix per year."""
+    years = sorted(df["year"].unique())
+    counties, cocs, weights = load_allocation(years, allocation)
+    pop = county_values(df, counties, years)["POP"].to_numpy(dtype=float).reshape(len(years), len(counties))
+
+    shares = {
+        f"POP_{year}": population_shares(w, pop[i])
+        for i, (year, w) in enumerate(zip(years, weights))
+    }
+    save_weights(COC_POP_WEIGHTS, counties, cocs, **shares)
+    print(f"Saved population-share weights to {COC_POP_WEIGHTS}")
+
+
 # -----------------------------
 # MAIN
 # -----------------------------
 
 def main():
-    df = add_population_data()
-    df = add_unemployment_data(df)
-    df = add_covid_data(df, COVID)
-    df.to_csv(COUNTY_CLEAN, index=False)
+    df = county_covariates()
+    write_csv(df, COUNTY_CLEAN)
     print(df.head())
     df_coc = collapsing_by_coc(df)
-    df_coc.to_csv(COVARIATES, index=False)
+    write_csv(df_coc, COVARIATES)
     print(df_coc.head())
+    save_population_weights(df)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
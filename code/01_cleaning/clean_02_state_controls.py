@@ -6,68 +6,16 @@ from config import STATE_CLEAN, UNEMP, UNEMP, STATE_POP_10, STATE_POP_20, COVID
 import time
 from tqdm import tqdm
 import numpy as np
-
-state_fips_dict = {
-    "Alabama": "01",
-    "Alaska": "02",
-    "Arizona": "04",
-    "Arkansas": "05",
-    "California": "06",
-    "Colorado": "08",
-    "Connecticut": "09",
-    "Delaware": "10",
-    "District of Columbia": "11",
-    "Florida": "12",
-    "Georgia": "13",
-    "Hawaii": "15",
-    "Idaho": "16",
-    "Illinois": "17",
-    "Indiana": "18",
-    "Iowa": "19",
-    "Kansas": "20",
-    "Kentucky": "21",
-    "Louisiana": "22",
-    "Maine": "23",
-    "Maryland": "24",
-    "Massachusetts": "25",
-    "Michigan": "26",
-    "Minnesota": "27",
-    "Mississippi": "28",
-    "Missouri": "29",
-    "Montana": "30",
-    "Nebraska": "31",
-    "Nevada": "32",
-    "New Hampshire": "33",
-    "New Jersey": "34",
-    "New Mexico": "35",
-    "New York": "36",
-    "North Carolina": "37",
-    "North Dakota": "38",
-    "Ohio": "39",
-    "Oklahoma": "40",
-    "Oregon": "41",
-    "Pennsylvania": "42",
-    "Rhode Island": "44",
-    "South Carolina": "45",
-    "South Dakota": "46",
-    "Tennessee": "47",
-    "Texas": "48",
-    "Utah": "49",
-    "Vermont": "50",
-    "Virginia": "51",
-    "Washington": "53",
-    "West Virginia": "54",
-    "Wisconsin": "55",
-    "Wyoming": "56",
-    "Puerto Rico": "72",
-    "Virgin Islands": "78",
-    "U.S. Virgin Islands": "78"
-}
+from laus import read_laus_years
+from covid import covid_county_year
+from cache import read_excel
+from geography import state_fips_from_name, county_state
+from schema import write_csv
 
 
 def population_data(): 
-    pop10 = pd.read_excel(STATE_POP_10, sheet_name="NST-EST2020INT-POP", skiprows=3)
-    pop20 = pd.read_excel(STATE_POP_20, sheet_name="NST-EST2024-POP",skiprows=3)
+    pop10 = read_excel(STATE_POP_10, sheet_name="NST-EST2020INT-POP", skiprows=3)
+    pop20 = read_excel(STATE_POP_20, sheet_name="NST-EST2024-POP",skiprows=3)
 
     pop10 = pop10.rename(columns={'Unnamed: 0': 'state', 2016: 'POP_2016', 2017: 'POP_2017', 2018: 'POP_2018', 2019: 'POP_2019'})
     pop20 = pop20.rename(columns={'Unnamed: 0': 'state', 2020: 'POP_2020', 2021: 'POP_2021', 2022: 'POP_2022', 2023: 'POP_2023'})
@@ -75,8 +23,8 @@ def population_data():
     pop10['state'] = pop10['state'].str.strip('.')
     pop20['state'] = pop20['state'].str.strip('.')
 
-    pop10['state_fips'] = pop10['state'].map(state_fips_dict)
-    pop20['state_fips'] = pop20['state'].map(state_fips_dict)
+    pop10['state_fips'] = state_fips_from_name(pop10['state'])
+    pop20['state_fips'] = state_fips_from_name(pop20['state'])
     
     keepcols10 = ['state', 'state_fips',  'POP_2016', 'POP_2017', 'POP_2018', 'POP_2019']
     keepcols20 = ['state_fips', 'POP_2020', 'POP_2021', 'POP_2022', 'POP_2023']
@@ -85,8 +33,8 @@ def population_data():
     pop20 = pop20[keepcols20]
 
     # drop if not a state (state_fips == NaN)
-    pop10 = pop10.dropna(subset=['state_fips'])
-    pop20 = pop20.dropna(subset=['state_fips'])
+    pop10 = pop10.dropna(subset=['state_fips']).astype({'state_fips': 'int8'})
+    pop20 = pop20.dropna(subset=['state_fips']).astype({'state_fips': 'int8'})
 
     # change POP columns float --> int
     for col in ['POP_2016', 'POP_2017', 'POP_2018', 'POP_2019']:
@@ -101,108 +49,51 @@ def population_data():
 
 
 def unemployment_data(df):
-    def clean_unemployment_data(path, sheetname, year):
-        df = pd.read_excel(path, sheet_name=sheetname, skiprows=1)
-        # Example cleaning steps (these would depend on the actual data format)
-        df = df.rename(columns={"State FIPS Code": "state_fips", "County FIPS Code": "countyfips", 
-                                "Unemployed": f"UNEMP_{year}", "Labor Force": f"LF_{year}"})
-        df = df[["state_fips", f"UNEMP_{year}", f"LF_{year}"]]
-
-        # group by state (sum UNEMP and LF for all obs with the same fips code)
-        df = df.groupby("state_fips").sum().reset_index()
-        
-        # change LF and UNEMP to float64, coerce
-        # Coerce to numeric (non-numeric becomes NaN)
-        df[f'UNEMP_{year}'] = pd.to_numeric(df[f'UNEMP_{year}'], errors='coerce')
-        df[f'LF_{year}'] = pd.to_numeric(df[f'LF_{year}'], errors='coerce')
-
-        # Drop rows where either is missing
-        df = df.dropna(subset=[f'UNEMP_{year}', f'LF_{year}'])
-
-        # Now compute unemployment rate
-        df[f'U3_{year}'] = df[f'UNEMP_{year}'] / df[f'LF_{year}'] * 100
-        df[f'U3_{year}'] = df[f'U3_{year}'].round(2)
-
-        # change state fips to string and pad with zeros (2), for example 1 --> '01'
-        df['state_fips'] = (
-            df['state_fips']
-                .astype(int)
-                .astype(str)
-                .str.zfill(2)
-        )
-
-        # drop LF and UNEMP columns
-        df = df.drop(columns=[f'UNEMP_{year}', f'LF_{year}'])
-
-        return df
-        
-    years = range(2016, 2024)
-
-    for year in years:
-        file_suffix = str(year)[-2:]  # 2016 → "16"
-        
-        unemp = clean_unemployment_data(
-            UNEMP / f"laucnty{file_suffix}.xlsx",
-            f"laucnty{file_suffix}",
-            year
-        )
-        
-        df = df.merge(unemp, on="state_fips", how="left")
-    return df
-
-def clean_covid_data(path, year):
-    """
-    Read NYT us-counties-YYYY.csv and return annual totals by county FIPS (GEOID).
-
-    Assumption (NYT yearly files): 'cases' and 'deaths' are cumulative within the year.
-    Therefore, max(cases) in that file = total cases during that year.
-    """
-    df = pd.read_csv(path, dtype={"fips": "Int64"})
-
-    # Keep only what we need
-    df = df.rename(columns={"fips": "GEOID"})
-    df = df[["GEOID", "cases", "deaths"]].copy()
-
-    # Drop rows without a county FIPS (NYT has some NaNs for "Unknown" etc.)
-    df = df.dropna(subset=["GEOID"])
+    # Only the years we have population for; the workbooks themselves are discovered from UNEMP
+    years = [int(c.split('_')[1]) for c in df.columns if c.startswith('POP_')]
+    laus = read_laus_years(UNEMP, years=years)
 
-    # Standardize GEOID as 5-char string
-    df["GEOID"] = df["GEOID"].astype(int).astype(str).str.zfill(5)
+    # group by state (sum UNEMP and LF for all obs with the same fips code), all years at once
+    laus = laus.groupby(["statefips", "year"])[["unemployed", "labor_force"]].sum().reset_index()
 
-    # End-of-year totals (within-year cumulative)
-    df = df.groupby("GEOID", as_index=False)[["cases", "deaths"]].max()
+    # Drop rows where either is missing
+    laus = laus.dropna(subset=["unemployed", "labor_force"])
 
-    # Rename to annual totals columns
-    df = df.rename(columns={
-        "cases": f"COVID_cases_{year}",
-        "deaths": f"COVID_deaths_{year}"
-    })
+    # Now compute unemployment rate
+    laus["U3"] = (laus["unemployed"] / laus["labor_force"] * 100).round(2)
 
-    # drop the last three digits of GEOID and rename the column 'state'
-    df['state_fips'] = df['GEOID'].str[:-3]
-    df = df.drop(columns=["GEOID"])
-
-    # group by state_fips, sum
-    df = df.groupby("state_fips").sum().reset_index()
-
-    # make the COVID_deaths_{year} column float --> int
-    df[f'COVID_deaths_{year}'] = df[f'COVID_deaths_{year}'].astype(int)
+    unemp = laus.pivot(index="statefips", columns="year", values="U3")
+    unemp.columns = [f"U3_{year}" for year in unemp.columns]
+    unemp = unemp.reset_index()
+    unemp["state_fips"] = unemp.pop("statefips").astype("int8")
 
+    df = df.merge(unemp, on="state_fips", how="left")
     return df
 
-
 def add_covid_data(df):
     """
-    Add annual county-level COVID cases/deaths to df using GEOID merge.
-    Produces COVID_cases_YYYY and COVID_deaths_YYYY for YYYY=2020..2023 plus zeros for 2016..2019.
+    Add annual state-level COVID cases/deaths (sum of county end-of-year totals).
+    Produces COVID_cases_YYYY and COVID_deaths_YYYY for every NYT year plus zeros for earlier years.
     """
-    # Merge annual totals (2020-2023)
-    for year in [2020, 2021, 2022, 2023]:
-        covid_year = clean_covid_data(COVID / f"us-counties-{year}.csv", year)
-        df = df.merge(covid_year, on="state_fips", how="left")
+    covid = covid_county_year(COVID)
+
+    # county FIPS -> state FIPS, then sum counties within state-year
+    covid["state_fips"] = county_state(covid["county_fips"])
+    covid = covid.groupby(["state_fips", "year"])[["COVID_cases", "COVID_deaths"]].sum()
+
+    # make the COVID_deaths column float --> int
+    covid["COVID_deaths"] = covid["COVID_deaths"].astype(int)
+
+    covid = covid.unstack("year")
+    years = sorted(covid.columns.get_level_values("year").unique())
+    covid.columns = [f"{var}_{year}" for var, year in covid.columns]
+    covid = covid[[f"{var}_{year}" for year in years for var in ["COVID_cases", "COVID_deaths"]]]
+
+    df = df.merge(covid.reset_index(), on="state_fips", how="left")
 
     # Add pre-COVID years explicitly as zeros
-    for year in [2016, 2017, 2018, 2019]:
+    pop_years = [int(c.split('_')[1]) for c in df.columns if c.startswith('POP_')]
+    for year in [y for y in pop_years if y < min(years)]:
         df[f"COVID_cases_{year}"] = 0
         df[f"COVID_deaths_{year}"] = 0
 
@@ -224,7 +115,7 @@ def main():
 
     df_long["year"] = df_long["year"].astype(int)
     print(df_long.head())
-    df_long.to_csv(STATE_CLEAN, index=False)
+    write_csv(df_long, STATE_CLEAN)
     print(f'saved to {STATE_CLEAN}')
 
 
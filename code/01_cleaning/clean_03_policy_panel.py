@@ -11,98 +11,29 @@ from typing import Dict, Tuple, Iterable
 import pandas as pd
 import numpy as np
 
-from config import STATE_POLICY, POLICY_PANEL, SCORECARD
+from config import STATE_POLICY, POLICY_PANEL, POLICY_PANEL_QUARTERLY, POLICY_PANEL_MONTHLY, POLICY_CUBE, SCORECARD
+from cache import read_excel
+from policy_intervals import parse_us_dates, policy_intervals, period_bounds, period_exposure
+from policy_cube import PolicyCube
+from geography import state_fips_from_name, state_code, state_code_from_name, is_territory
+from schema import write_csv
 
 # ---------------------------------------------------------------------
 # SETTINGS
 # ---------------------------------------------------------------------
 
+# Default study window; clean_state_policy(start, end) accepts any other
 START = pd.Timestamp("2020-01-01")
 END   = pd.Timestamp("2022-12-31")
 SHEET_NAME = "Moratoria Dataset"
 
-# 50 states + DC + PR + VI
-STATE_CODE_MAP = {
-    "Alabama": "AL", "Alaska": "AK", "Arizona": "AZ", "Arkansas": "AR",
-    "California": "CA", "Colorado": "CO", "Connecticut": "CT",
-    "Delaware": "DE", "Washington, DC": "DC",
-    "Florida": "FL", "Georgia": "GA", "Hawaii": "HI",
-    "Idaho": "ID", "Illinois": "IL", "Indiana": "IN",
-    "Iowa": "IA", "Kansas": "KS", "Kentucky": "KY",
-    "Louisiana": "LA", "Maine": "ME", "Maryland": "MD",
-    "Massachusetts": "MA", "Michigan": "MI", "Minnesota": "MN",
-    "Mississippi": "MS", "Missouri": "MO", "Montana": "MT",
-    "Nebraska": "NE", "Nevada": "NV", "New Hampshire": "NH",
-    "New Jersey": "NJ", "New Mexico": "NM", "New York": "NY",
-    "North Carolina": "NC", "North Dakota": "ND", "Ohio": "OH",
-    "Oklahoma": "OK", "Oregon": "OR", "Pennsylvania": "PA",
-    "Rhode Island": "RI", "South Carolina": "SC",
-    "South Dakota": "SD", "Tennessee": "TN",
-    "Texas": "TX", "Utah": "UT", "Vermont": "VT",
-    "Virginia": "VA", "Washington": "WA", "West Virginia": "WV",
-    "Wisconsin": "WI", "Wyoming": "WY",
-    "Puerto Rico": "PR",
-    "Virgin Islands": "VI",
-    "U.S. Virgin Islands": "VI",
-    "Washington, D.C.": "DC",
+# Sub-annual exposure panels written next to policy_panel.csv:
+# name -> (pandas period frequency, output path)
+SUB_ANNUAL_PANELS = {
+    "quarter": ("Q", POLICY_PANEL_QUARTERLY),
+    "month": ("M", POLICY_PANEL_MONTHLY),
 }
 
-state_fips_dict = {
-    "Alabama": "01",
-    "Alaska": "02",
-    "Arizona": "04",
-    "Arkansas": "05",
-    "California": "06",
-    "Colorado": "08",
-    "Connecticut": "09",
-    "Delaware": "10",
-    "Washington, DC": "11",
-    "Florida": "12",
-    "Georgia": "13",
-    "Hawaii": "15",
-    "Idaho": "16",
-    "Illinois": "17",
-    "Indiana": "18",
-    "Iowa": "19",
-    "Kansas": "20", 
-    "Kentucky": "21",
-    "Louisiana": "22",
-    "Maine": "23",
-    "Maryland": "24",
-    "Massachusetts": "25",
-    "Michigan": "26",
-    "Minnesota": "27",
-    "Mississippi": "28",
-    "Missouri": "29",
-    "Montana": "30",
-    "Nebraska": "31",
-    "Nevada": "32",
-    "New Hampshire": "33",
-    "New Jersey": "34",
-    "New Mexico": "35",
-    "New York": "36",
-    "North Carolina": "37",
-    "North Dakota": "38",
-    "Ohio": "39",
-    "Oklahoma": "40",
-    "Oregon": "41",
-    "Pennsylvania": "42",
-    "Rhode Island": "44",
-    "South Carolina": "45",
-    "South Dakota": "46",
-    "Tennessee": "47",
-    "Texas": "48",
-    "Utah": "49",
-    "Vermont": "50",
-    "Virginia": "51",
-    "Washington": "53",
-    "West Virginia": "54",
-    "Wisconsin": "55",
-    "Wyoming": "56",
-}
-
-
-
 STATE_POLICY_COLUMNS: Dict[str, Tuple[str, str]] = {
     "overall_active": ("Overall First Date of Effect", "Overall Date of Expiration"),
     "s1_active": ("S1 First Date of Effect", "S1 Date of Expiration"),
@@ -134,144 +65,127 @@ def clean_state_name(s: object) -> str:
     return s.strip()
 
 
-def parse_mixed_us_date(x: object) -> pd.Timestamp:
-    """Safely parse MM/DD/YYYY and MM/DD/YY formats."""
-    if pd.isna(x):
-        return pd.NaT
+# ---------------------------------------------------------------------
+# MAIN BUILDER
+# ---------------------------------------------------------------------
 
-    if isinstance(x, pd.Timestamp):
-        return x
+def load_state_policy() -> pd.DataFrame:
+    """Moratoria rows for the 50 states + DC, with every date column parsed."""
+    df = read_excel(STATE_POLICY, sheet_name=SHEET_NAME)
 
-    s = str(x).strip()
-    if not s:
-        return pd.NaT
+    # Clean state names
+    df["state_clean"] = df["State"].apply(clean_state_name)
+    df["state_fips"] = state_fips_from_name(df["state_clean"])
+    df["state_code"] = state_code(df["state_fips"])
 
-    for fmt in ("%m/%d/%Y", "%m/%d/%y"):
-        try:
-            return pd.to_datetime(s, format=fmt)
-        except Exception:
-            continue
+    # Keep only mapped states; the annual panel covers the 50 states + DC
+    df = df[df["state_code"].notna() & ~is_territory(df["state_fips"])].copy()
 
-    return pd.to_datetime(s, errors="coerce")
+    # Parse all date columns in one pass
+    date_cols = sorted({c for pair in STATE_POLICY_COLUMNS.values() for c in pair})
+    df[date_cols] = parse_us_dates(df[date_cols])
+    return df
 
 
-def flag_policy_window(
-    state_daily: pd.DataFrame,
-    policy_df: pd.DataFrame,
-    start_col: str,
-    end_col: str,
-    out_col: str,
-) -> None:
-    """Assign 1 for days covered by policy window (overlap safe)."""
+def policy_prefix(col: str) -> str:
+    return col.replace("_active", "")
 
-    for _, row in policy_df.iterrows():
-        start = row[start_col]
-        end = row[end_col]
 
-        if pd.isna(start):
-            continue
-        if pd.isna(end):
-            end = END
+def period_panel(states: pd.DataFrame, intervals: pd.DataFrame, freq: str,
+                 start: pd.Timestamp, end: pd.Timestamp, detail: bool = False) -> pd.DataFrame:
+    """State x period panel of days active per policy, from merged intervals.
 
-        start = max(start, START)
-        end = min(end, END)
+    With detail=True each policy also gets the share of the period covered
+    and its first/last active day within the period.
+    """
+    bounds = period_bounds(freq, start, end)
+    bounds["total_days"] = (bounds["period_end"] - bounds["period_start"]).dt.days + 1
+    exposure = period_exposure(intervals, freq, start, end)
 
-        if end < start:
-            continue
+    # Every state x period, including ones with no active policy
+    skeleton = pd.MultiIndex.from_product([states["state_code"], bounds["period"]],
+                                          names=["state_code", "period"])
+    policies = list(STATE_POLICY_COLUMNS)
 
-        mask = (
-            (state_daily["state_code"] == row["state_code"]) &
-            (state_daily["date"] >= start) &
-            (state_daily["date"] <= end)
-        )
-        state_daily.loc[mask, out_col] = 1
+    def wide(value, fill):
+        out = exposure.pivot(index=["state_code", "period"], columns="policy", values=value)
+        return out.reindex(index=skeleton, columns=policies, fill_value=fill)
 
+    days = wide("days", 0).fillna(0).astype(int)
+    blocks = {"days": days}
+    if detail:
+        total = days.index.get_level_values("period").map(bounds.set_index("period")["total_days"])
+        blocks["share"] = days.div(np.asarray(total), axis=0)
+        blocks["first"] = wide("first_active", pd.NaT)
+        blocks["last"] = wide("last_active", pd.NaT)
 
-# ---------------------------------------------------------------------
-# MAIN BUILDER
-# ---------------------------------------------------------------------
+    # Columns grouped by policy: overall_days, overall_share, ..., s1_days, ...
+    wide_df = pd.concat(blocks, axis=1).swaplevel(axis=1)[policies]
+    wide_df.columns = [f"{policy_prefix(p)}_{stat}" for p, stat in wide_df.columns]
 
-def clean_state_policy() -> pd.DataFrame:
+    panel = states.merge(wide_df.reset_index(), on="state_code")
+    if detail:
+        panel = panel.merge(bounds[["period", "period_start", "period_end"]], on="period")
+        panel = panel[list(states.columns) + ["period", "period_start", "period_end"]
+                      + list(wide_df.columns)]
+    panel["total_days"] = panel["period"].map(bounds.set_index("period")["total_days"])
+    return panel
 
-    df = pd.read_excel(STATE_POLICY, sheet_name=SHEET_NAME)
 
-    # Clean state names
-    df["state_clean"] = df["State"].apply(clean_state_name)
-    df["state_code"] = df["state_clean"].map(STATE_CODE_MAP)
-    df["state_fips"] = df["state_clean"].map(state_fips_dict)
+def state_policy_intervals(start: pd.Timestamp = START, end: pd.Timestamp = END):
+    """States in the panel and their merged policy windows within [start, end]."""
+    df = load_state_policy()
+    states = df[["state_code", "state_fips"]].drop_duplicates("state_code")
+    return states, policy_intervals(df, STATE_POLICY_COLUMNS, start, end)
 
-    # Keep only mapped states/territories
-    df = df[df["state_code"].notna()].copy()
 
-    # Parse all date columns
-    date_cols = sorted({c for pair in STATE_POLICY_COLUMNS.values() for c in pair})
-    for col in date_cols:
-        df[col] = df[col].apply(parse_mixed_us_date)
-
-    # ------------------------------------------------------------
-    # Build daily skeleton (NOW KEEP state_fips)
-    # ------------------------------------------------------------
-    all_days = pd.date_range(START, END, freq="D")
-
-    state_daily = (
-        df[["state_code", "state_fips"]]
-        .drop_duplicates()
-        .assign(key=1)
-        .merge(pd.DataFrame({"date": all_days, "key": 1}), on="key")
-        .drop(columns="key")
-    )
-
-    # ------------------------------------------------------------
-    # Flag policies
-    # ------------------------------------------------------------
-    for out_col, (start_col, end_col) in STATE_POLICY_COLUMNS.items():
-        state_daily[out_col] = 0
-        flag_policy_window(
-            state_daily=state_daily,
-            policy_df=df[["state_code", start_col, end_col]],
-            start_col=start_col,
-            end_col=end_col,
-            out_col=out_col,
-        )
-
-    # Enforce binary
-    for col in STATE_POLICY_COLUMNS.keys():
-        state_daily[col] = state_daily[col].clip(0, 1).astype(int)
-
-    # ------------------------------------------------------------
-    # Aggregate annually (NOW GROUP BY state_fips too)
-    # ------------------------------------------------------------
-    state_daily["year"] = state_daily["date"].dt.year
-
-    agg_spec = {
-        f"{k.replace('_active','')}_days": (k, "sum")
-        for k in STATE_POLICY_COLUMNS.keys()
-    }
-    agg_spec["total_days"] = ("date", "count")
-
-    annual = (
-        state_daily
-        .groupby(["state_code", "state_fips", "year"], as_index=False)
-        .agg(**agg_spec)
-        .sort_values(["state_code", "year"])
-    )
-
-    return annual
+def annual_panel(states, intervals, start=START, end=END) -> pd.DataFrame:
+    annual = period_panel(states, intervals, "Y", start, end)
+    annual.insert(2, "year", annual.pop("period").dt.year)
+    return annual.sort_values(["state_code", "year"]).reset_index(drop=True)
+
+
+def sub_annual_panel(states, intervals, unit, start=START, end=END) -> pd.DataFrame:
+    """State x quarter or state x month exposure: days, share, first/last active day."""
+    freq, _ = SUB_ANNUAL_PANELS[unit]
+    panel = period_panel(states, intervals, freq, start, end, detail=True)
+    period = panel.pop("period")
+    panel.insert(2, "year", period.dt.year)
+    panel.insert(3, unit, period.dt.quarter if unit == "quarter" else period.dt.month)
+    return panel.sort_values(["state_code", "year", unit]).reset_index(drop=True)
+
+
+def clean_state_policy(start: pd.Timestamp = START, end: pd.Timestamp = END) -> pd.DataFrame:
+    states, intervals = state_policy_intervals(start, end)
+    return annual_panel(states, intervals, start, end)
 
 def merge_scorecard(policy_panel):
-    sc = pd.read_excel(SCORECARD)
-    sc["state_code"] = sc["state"].map(STATE_CODE_MAP)
+    sc = read_excel(SCORECARD)
+    sc["state_code"] = state_code_from_name(sc["state"])
     df = pd.merge(policy_panel, sc, on="state_code", how="left")
     return df
 
 
-def main() -> None:
-    out = clean_state_policy()
+def main(start: pd.Timestamp = START, end: pd.Timestamp = END) -> None:
+    # One parse of the moratoria workbook; every panel comes from the same intervals
+    states, intervals = state_policy_intervals(start, end)
+
+    out = annual_panel(states, intervals, start, end)
     print(f"States/Territories: {out['state_code'].nunique()} | Years: {out['year'].nunique()}")
     df = merge_scorecard(out)
-    df.to_csv(POLICY_PANEL, index=False)
+    write_csv(df, POLICY_PANEL)
     print(f"✓ Wrote policy panel to {POLICY_PANEL}")
 
+    for unit, (_, path) in SUB_ANNUAL_PANELS.items():
+        panel = sub_annual_panel(states, intervals, unit, start, end)
+        write_csv(panel, path)
+        print(f"✓ Wrote state x {unit} exposure panel ({len(panel)} rows) to {path}")
+
+    # Daily status for event-time / lag / lead features downstream
+    cube = PolicyCube.build(intervals, states["state_code"], list(STATE_POLICY_COLUMNS), start, end)
+    cube.save(POLICY_CUBE)
+    print(f"✓ Wrote daily policy cube {cube.bits.shape} ({cube.bits.nbytes} bytes) to {POLICY_CUBE}")
+
 
 if __name__ == "__main__":
     main()
@@ -1,97 +1,19 @@
 from pathlib import Path
 import pandas as pd
-from config import HUD_DATA, HUD_CLEAN, COVARIATES, POLICY_PANEL, ALL_DATA
+from config import COVARIATES, POLICY_PANEL, ALL_DATA
+from panels import write_panel
+from hud import load_hud_coc_year
+from geography import coc_state_code
+from schema import read_csv
 
 
 # ------------------------------------------------------------
-# 1. Load HUD Data (already naturally long)
-# ------------------------------------------------------------
-
-def load_HUD_data(HUD_path):
-    xls = pd.ExcelFile(HUD_path)
-
-    df_list = []
-    sheets = xls.sheet_names[1:]
-
-    for sheet in sheets:
-        try:
-            year = int(sheet)
-        except ValueError:
-            print(f"Skipping non-year sheet: {sheet}")
-            continue
-
-        temp = pd.read_excel(HUD_path, sheet_name=sheet, header=1)
-        temp["year"] = year
-        df_list.append(temp)
-
-    df_combined = pd.concat(df_list, ignore_index=True)
-
-    return df_combined
-
-
-# ------------------------------------------------------------
-# 2. Clean HUD Data (keep LONG)
-# ------------------------------------------------------------
-
-def clean_HUD_data(df):
-
-    rename_map = {
-        "Continuum of Care (CoC)": "coc_name",
-        "HUD CoC Number": "coc_code",
-        "ES-SH-TH-PH 1st Time Homeless": "inflow",
-        "ES-SH-TH Avg (Days)": "avg_days_homeless",
-        "ES-SH-TH Median (Days)": "median_days_homeless",
-        "Percent with Successful  ES, TH, SH, PH-RRH Exit": "success_rate",
-        "Total Persons Exiting ES, TH, SH, PH-RRH": "exits",
-        "Total Persons Exiting ES, TH, SH, PH-RRH to Permanent Housing": "exits_perm",
-        "Total Non-DV Beds on 2015 HIC ES+TH": "beds_2015",
-        "2015 Bed coverage Percent on HMIS for ES-TH Combined": "bed_coverage_pct"
-    }
-
-    df = df.rename(columns=lambda x: x.strip() if isinstance(x, str) else x)
-    df = df.rename(columns=rename_map)
-
-    keep_cols = [
-        "coc_name", "coc_code", "year", "inflow",
-        "avg_days_homeless", "median_days_homeless",
-        "success_rate", "exits", "exits_perm",
-        "beds_2015", "bed_coverage_pct"
-    ]
-
-    df = df[[c for c in keep_cols if c in df.columns]]
-
-    df = df.dropna(subset=["coc_code"])
-
-    # Ensure numeric
-    num_cols = [
-        "inflow", "avg_days_homeless", "median_days_homeless",
-        "exits", "exits_perm", "success_rate"
-    ]
-
-    df[num_cols] = df[num_cols].apply(pd.to_numeric, errors="coerce")
-
-    # Optional: drop CoCs missing years
-    years_per_coc = df.groupby("coc_code")["year"].count()
-    missings = years_per_coc[years_per_coc < df["year"].nunique()]
-
-    if not missings.empty:
-        print("[WARNING] Dropping CoCs with missing years:")
-        print(missings)
-        df = df[~df["coc_code"].isin(missings.index)]
-
-    # Save long cleaned HUD
-    df.to_csv(HUD_CLEAN, index=False)
-
-    return df
-
-
-# ------------------------------------------------------------
-# 3. Merge Covariates (already long)
+# 1. Merge Covariates (already long)
 # ------------------------------------------------------------
 
 def merge_covariates(df_hud):
 
-    covars = pd.read_csv(COVARIATES)
+    covars = read_csv(COVARIATES)
 
     # Expecting:
     # coc_id | year | POP | UNEMP | COVID...
@@ -108,15 +30,15 @@ def merge_covariates(df_hud):
 
 
 # ------------------------------------------------------------
-# 4. Merge State Policy Panel
+# 2. Merge State Policy Panel
 # ------------------------------------------------------------
 
 def merge_policy(df):
 
-    policy = pd.read_csv(POLICY_PANEL)
+    policy = read_csv(POLICY_PANEL)
 
     # Extract state postal code from HUD CoC code
-    df["state_code"] = df["coc_code"].str.split("-").str[0].str.strip()
+    df["state_code"] = coc_state_code(df["coc_code"])
 
     # Merge policy panel
     df = pd.merge(
@@ -130,16 +52,15 @@ def merge_policy(df):
     # Fill policy columns with zeros outside 2020–2022
     # ------------------------------------------------------------
 
-    policy_cols = [col for col in policy.columns 
+    # Numeric columns only: text columns (the scorecard's state name) stay missing,
+    # since a 0 cannot go into a string/categorical column or be written to Stata
+    policy_cols = [col for col in policy.select_dtypes("number").columns
                    if col not in ["state_code", "year"]]
 
     df[policy_cols] = df[policy_cols].fillna(0)
 
     df = df.drop(columns=["state_code", "coc_id"])  # Drop helper columns
 
-    # Erroneous data: NY-511 in 2016 had a negative sucess rate, drop this obs
-    df = df[~((df["coc_code"] == "NY-511") & (df["year"] == 2016))]
-
     # Dropping obs with POP == 0 (only 7 obs, 5 of which are islands which are outliers in other ways)
     df = df[df["POP"] > 0]
 
@@ -148,7 +69,7 @@ def merge_policy(df):
     # ------------------------------------------------------------
 
     ever_treated = (
-        df.groupby("coc_code")["overall_days"]
+        df.groupby("coc_code", observed=True)["overall_days"]
         .max()
         .reset_index()
         .rename(columns={"overall_days": "ever_treated"})
@@ -169,11 +90,8 @@ def merge_policy(df):
 # ------------------------------------------------------------
 
 def main():
-    print("Loading HUD data...")
-    df = load_HUD_data(HUD_DATA)
-
-    print("Cleaning HUD data (long format)...")
-    df = clean_HUD_data(df)
+    print("Loading cleaned HUD CoC-year data...")
+    df = load_hud_coc_year()
 
     print("Merging CoC covariates...")
     df = merge_covariates(df)
@@ -182,7 +100,7 @@ def main():
     df = merge_policy(df)
 
     print("Saving final merged dataset...")
-    df.to_stata(ALL_DATA)
+    write_panel(df, ALL_DATA)
 
     print("Done.")
     print(df.head())
@@ -1,10 +1,12 @@
+import os
 from pathlib import Path
 
 # ============================================
 # BASE PATHS
 # ============================================
 PROJECT_ROOT = Path(__file__).parent.parent.parent
-DATA_DIR = PROJECT_ROOT / "data"
+# DMP_DATA_DIR points the pipeline at another data tree (e.g. the synthetic benchmark inputs)
+DATA_DIR = Path(os.environ.get("DMP_DATA_DIR", PROJECT_ROOT / "data"))
 CODE_DIR = PROJECT_ROOT / "code"
 
 # ============================================
@@ -18,6 +20,13 @@ CLEAN_DIR = DATA_DIR / "02_cleaned"
 # ============================================
 HUD_DATA = RAW_DIR / "HUD.xlsx"
 COC_SHP = RAW_DIR / "CoC_GIS_National_Boundary.gdb"
+# CoC boundary vintage (year) -> geodatabase; add earlier/later HUD releases here
+COC_VINTAGES = {
+    2023: COC_SHP,
+}
+# HUD years covered by the year-indexed crosswalk and the county controls. Each
+# year uses the latest boundary vintage in COC_VINTAGES that is not after it.
+YEARS = range(2016, 2024)
 COUNTY_SHP = RAW_DIR / "tl_2023_us_county/tl_2023_us_county.shp"
 COUNTY_POP_2020s = RAW_DIR / "population" / "co-est2024-alldata.csv"
 COUNTY_POP_2010s = RAW_DIR / "population" / "co-est2019-alldata.csv"
@@ -32,10 +41,34 @@ SCORECARD = RAW_DIR / "HousingPolicyScorecard.xlsx"
 # CLEAN DATA
 # ============================================
 HUD_CLEAN = CLEAN_DIR / "HUD_only.csv"
+# Typed CoC-year HUD table both stage 4 builds start from (HUD_only.csv is its CSV copy)
+HUD_COC_YEAR = CLEAN_DIR / "hud_coc_year.parquet"
 CROSSWALK = CLEAN_DIR / "coc_county_crosswalk.csv"
+CROSSWALK_YEARS = CLEAN_DIR / "coc_county_crosswalk_years.csv"
+COC_WEIGHTS = CLEAN_DIR / "coc_county_weights.npz"
+COC_POP_WEIGHTS = CLEAN_DIR / "coc_county_pop_weights.npz"
+# Fast-mode crosswalk runs write their approximate outputs here; downstream
+# stages only ever read the exact files above
+CROSSWALK_FAST = CLEAN_DIR / "coc_county_crosswalk_fast.csv"
+CROSSWALK_YEARS_FAST = CLEAN_DIR / "coc_county_crosswalk_years_fast.csv"
+COC_WEIGHTS_FAST = CLEAN_DIR / "coc_county_weights_fast.npz"
+CROSSWALK_APPROX_REPORT = CLEAN_DIR / "crosswalk_approx_report.csv"
 COUNTY_CLEAN = CLEAN_DIR / "county_level_data.csv"
 STATE_CLEAN = CLEAN_DIR / "state_level_data.csv"
 COVARIATES = CLEAN_DIR / "covariates.csv"
 POLICY_PANEL = CLEAN_DIR / "policy_panel.csv"
+POLICY_PANEL_QUARTERLY = CLEAN_DIR / "policy_panel_quarterly.csv"
+POLICY_PANEL_MONTHLY = CLEAN_DIR / "policy_panel_monthly.csv"
+# Daily state x policy status, bit-packed (index in policy_cube.json)
+POLICY_CUBE = CLEAN_DIR / "policy_cube.npy"
 ALL_DATA = CLEAN_DIR / "all_data.dta"
-ALL_STATE_DATA = CLEAN_DIR / "all_state_data.dta"
\ No newline at end of file
+ALL_STATE_DATA = CLEAN_DIR / "all_state_data.dta"
+
+# ============================================
+# CACHE
+# ============================================
+CACHE_DIR = CLEAN_DIR / "cache"
+# Input/output hashes of the last successful run of each master_clean stage
+STAGE_STATE = CLEAN_DIR / "stage_state.json"
+# One <stage>.log per master_clean stage, overwritten on each run
+LOG_DIR = CLEAN_DIR / "logs"
\ No newline at end of file
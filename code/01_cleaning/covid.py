@@ -0,0 +1,87 @@
+"""
+Title: covid.py
+NYT county COVID-19 files (us-counties-YYYY.csv), shared by the county and
+state control stages.
+
+Assumption (NYT yearly files): 'cases' and 'deaths' are cumulative within the
+year, so max(cases) in a file = total cases during that year. Files are
+streamed in chunks with only the three columns we use, the four years are read
+concurrently, and the county-year result is cached under data/02_cleaned/cache
+so both stages (and reruns) read the CSVs at most once.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+import pandas as pd
+
+from cache import cache_key, cache_path, prune, temp_path
+from config import COVID, CACHE_DIR
+
+N_WORKERS = os.cpu_count()
+CHUNK_ROWS = 500_000
+COVID_FILE = re.compile(r"us-counties-(\d{4})\.csv$")
+
+# float32 holds every FIPS code and county count exactly and allows the NaNs NYT uses
+COLUMNS = ["fips", "cases", "deaths"]
+DTYPES = {"fips": "float32", "cases": "float32", "deaths": "float32"}
+
+
+def covid_files(covid_dir: Path = COVID) -> Dict[int, Path]:
+    files = {}
+    for path in Path(covid_dir).iterdir():
+        m = COVID_FILE.match(path.name)
+        if m:
+            files[int(m.group(1))] = path
+    return dict(sorted(files.items()))
+
+
+def read_covid_year(path: Path, year: int) -> pd.DataFrame:
+    """Within-year max of cases/deaths per county, computed chunk by chunk."""
+    partial = []
+    for chunk in pd.read_csv(path, usecols=COLUMNS, dtype=DTYPES, chunksize=CHUNK_ROWS):
+        # Drop rows without a county FIPS (NYT has some NaNs for "Unknown" etc.)
+        chunk = chunk.dropna(subset=["fips"])
+        partial.append(chunk.groupby("fips")[["cases", "deaths"]].max())
+
+    df = pd.concat(partial).groupby(level="fips").max().reset_index()
+    df["county_fips"] = df.pop("fips").astype("int32")
+    df["year"] = year
+    return df
+
+
+def covid_county_year(covid_dir: Path = COVID, n_workers: Optional[int] = N_WORKERS) -> pd.DataFrame:
+    """Long (county_fips, year, COVID_cases, COVID_deaths) table for every NYT file."""
+    files = covid_files(covid_dir)
+    if not files:
+        raise FileNotFoundError(f"No us-counties-YYYY.csv files found in {covid_dir}")
+
+    key = cache_key(*files.values(), chunk_cols=COLUMNS)
+    path = cache_path("covid_county_year", key)
+    if path.exists():
+        print(f"Loading cached county-year COVID totals ({key})")
+        return pd.read_parquet(path)
+
+    print(f"Reading NYT COVID files for {min(files)}-{max(files)}")
+    if n_workers is None or n_workers <= 1:
+        frames = list(map(read_covid_year, files.values(), files.keys()))
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(files))) as pool:
+            frames = list(pool.map(read_covid_year, files.values(), files.keys()))
+
+    df = pd.concat(frames, ignore_index=True)
+    df = df.rename(columns={"cases": "COVID_cases", "deaths": "COVID_deaths"})
+    df[["COVID_cases", "COVID_deaths"]] = df[["COVID_cases", "COVID_deaths"]].astype(float)
+    df = df[["county_fips", "year", "COVID_cases", "COVID_deaths"]]
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = temp_path(path)
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    prune("covid_county_year", keep=path)
+    return df
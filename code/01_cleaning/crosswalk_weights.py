@@ -0,0 +1,119 @@
+"""
+Title: crosswalk_weights.py
+Sparse county x CoC weight matrices.
+
+Rows are counties (integer FIPS, state * 1000 + county), columns are CoCs. Stage 1 writes the
+area-share matrix (each county's intersected area split across the CoCs it
+touches, rows sum to 1). Stage 2 builds one matrix per year from the
+year-indexed crosswalk, aggregates every county variable to the CoC level with a
+single sparse product, and writes the population-share matrices (each CoC's
+population split across its counties, columns sum to 1).
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def from_pairs(
+    pairs: pd.DataFrame,
+    value_col: str,
+    county_col: str = "county_fips",
+    coc_col: str = "coc_id",
+) -> Tuple[np.ndarray, np.ndarray, sparse.csr_matrix]:
+    """Build a county x CoC matrix from a long table of pairs."""
+    county_codes, counties = pd.factorize(pairs[county_col], sort=True)
+    coc_codes, cocs = pd.factorize(pairs[coc_col], sort=True)
+
+    matrix = sparse.csr_matrix(
+        (pairs[value_col].to_numpy(dtype=float), (county_codes, coc_codes)),
+        shape=(len(counties), len(cocs)),
+    )
+    return np.asarray(counties), np.asarray(cocs, dtype=str), matrix
+
+
+def from_pairs_by(
+    pairs: pd.DataFrame,
+    value_col: str,
+    by: str,
+    county_col: str = "county_fips",
+    coc_col: str = "coc_id",
+) -> Tuple[np.ndarray, np.ndarray, Dict[object, sparse.csr_matrix]]:
+    """One county x CoC matrix per value of `by`, all sharing the same row/column labels."""
+    county_codes, counties = pd.factorize(pairs[county_col], sort=True)
+    coc_codes, cocs = pd.factorize(pairs[coc_col], sort=True)
+    values = pairs[value_col].to_numpy(dtype=float)
+
+    matrices = {}
+    for key, idx in pairs.groupby(by).indices.items():
+        matrices[key] = sparse.csr_matrix(
+            (values[idx], (county_codes[idx], coc_codes[idx])),
+            shape=(len(counties), len(cocs)),
+        )
+    return np.asarray(counties), np.asarray(cocs, dtype=str), matrices
+
+
+def to_pairs(counties: np.ndarray, cocs: np.ndarray, matrix: sparse.csr_matrix) -> pd.DataFrame:
+    """Long (county_fips, coc_id, share) table of the nonzero entries."""
+    coo = matrix.tocoo()
+    return pd.DataFrame({
+        "county_fips": counties[coo.row],
+        "coc_id": cocs[coo.col],
+        "share": coo.data,
+    })
+
+
+def area_shares(inter: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, sparse.csr_matrix]:
+    """Share of each county's intersected area falling in each CoC."""
+    pairs = inter.rename(columns={"COCNUM": "coc_id"})
+    pairs = pairs.groupby(["county_fips", "coc_id"], as_index=False)["int_area"].sum()
+    pairs["share"] = pairs["int_area"] / pairs.groupby("county_fips")["int_area"].transform("sum")
+    return from_pairs(pairs, "share")
+
+
+def population_shares(matrix: sparse.csr_matrix, pop: np.ndarray) -> sparse.csr_matrix:
+    """Share of each CoC's (allocated) population living in each county."""
+    allocated = sparse.csr_matrix(matrix.multiply(np.nan_to_num(pop)[:, None]))
+    totals = np.asarray(allocated.sum(axis=0)).ravel()
+    inv = np.divide(1.0, totals, out=np.zeros_like(totals), where=totals > 0)
+    return sparse.csr_matrix(allocated @ sparse.diags(inv))
+
+
+def aggregate(matrix: sparse.csr_matrix, values: np.ndarray) -> np.ndarray:
+    """Weighted CoC totals for every column of a county x k array (NaN counts as 0)."""
+    return np.asarray(matrix.T @ np.nan_to_num(values))
+
+
+# ------------------------------------------------------------
+# On-disk format: one compressed .npz holding the row/column labels
+# and the CSR components of one or more named matrices
+# ------------------------------------------------------------
+
+def save_weights(path: Path, counties: np.ndarray, cocs: np.ndarray, **matrices: sparse.csr_matrix) -> None:
+    arrays = {"counties": np.asarray(counties), "cocs": np.asarray(cocs, dtype=str)}
+    for name, m in matrices.items():
+        m = sparse.csr_matrix(m)
+        arrays[f"{name}__data"] = m.data.astype(np.float32)
+        arrays[f"{name}__indices"] = m.indices.astype(np.int32)
+        arrays[f"{name}__indptr"] = m.indptr.astype(np.int32)
+    np.savez_compressed(path, **arrays)
+
+
+def load_weights(path: Path) -> Tuple[np.ndarray, np.ndarray, Dict[str, sparse.csr_matrix]]:
+    with np.load(path) as f:
+        counties, cocs = f["counties"], f["cocs"]
+        shape = (len(counties), len(cocs))
+        names = sorted({k.split("__")[0] for k in f.files if "__" in k})
+        matrices = {
+            name: sparse.csr_matrix(
+                (f[f"{name}__data"].astype(float), f[f"{name}__indices"], f[f"{name}__indptr"]),
+                shape=shape,
+            )
+            for name in names
+        }
+    return counties, cocs, matrices
@@ -0,0 +1,153 @@
+"""
+Title: geography.py
+Geography keys shared by every cleaning stage.
+
+States are integer FIPS codes (1 = Alabama), counties are one integer
+state * 1000 + county (1001 = Autauga, AL), and CoC codes ("AL-500") are
+pandas categoricals. Conversions between FIPS, postal codes and state names
+are vectorized lookups against the single STATES table below, which replaces
+the state dictionaries previously copied into each stage.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+# ------------------------------------------------------------
+# State table: 50 states + DC + PR + VI
+# ------------------------------------------------------------
+
+STATES = pd.DataFrame(
+    [
+        (1, "AL", "Alabama"), (2, "AK", "Alaska"), (4, "AZ", "Arizona"),
+        (5, "AR", "Arkansas"), (6, "CA", "California"), (8, "CO", "Colorado"),
+        (9, "CT", "Connecticut"), (10, "DE", "Delaware"), (11, "DC", "District of Columbia"),
+        (12, "FL", "Florida"), (13, "GA", "Georgia"), (15, "HI", "Hawaii"),
+        (16, "ID", "Idaho"), (17, "IL", "Illinois"), (18, "IN", "Indiana"),
+        (19, "IA", "Iowa"), (20, "KS", "Kansas"), (21, "KY", "Kentucky"),
+        (22, "LA", "Louisiana"), (23, "ME", "Maine"), (24, "MD", "Maryland"),
+        (25, "MA", "Massachusetts"), (26, "MI", "Michigan"), (27, "MN", "Minnesota"),
+        (28, "MS", "Mississippi"), (29, "MO", "Missouri"), (30, "MT", "Montana"),
+        (31, "NE", "Nebraska"), (32, "NV", "Nevada"), (33, "NH", "New Hampshire"),
+        (34, "NJ", "New Jersey"), (35, "NM", "New Mexico"), (36, "NY", "New York"),
+        (37, "NC", "North Carolina"), (38, "ND", "North Dakota"), (39, "OH", "Ohio"),
+        (40, "OK", "Oklahoma"), (41, "OR", "Oregon"), (42, "PA", "Pennsylvania"),
+        (44, "RI", "Rhode Island"), (45, "SC", "South Carolina"), (46, "SD", "South Dakota"),
+        (47, "TN", "Tennessee"), (48, "TX", "Texas"), (49, "UT", "Utah"),
+        (50, "VT", "Vermont"), (51, "VA", "Virginia"), (53, "WA", "Washington"),
+        (54, "WV", "West Virginia"), (55, "WI", "Wisconsin"), (56, "WY", "Wyoming"),
+        (72, "PR", "Puerto Rico"), (78, "VI", "Virgin Islands"),
+    ],
+    columns=["state_fips", "state_code", "state_name"],
+).astype({"state_fips": "int8"})
+
+TERRITORIES = [72, 78]
+
+# Other spellings found in the source files
+NAME_ALIASES = {
+    "Washington, DC": "District of Columbia",
+    "Washington, D.C.": "District of Columbia",
+    "U.S. Virgin Islands": "Virgin Islands",
+}
+
+_FIPS_BY_NAME = pd.Series(STATES["state_fips"].to_numpy(), index=STATES["state_name"])
+_FIPS_BY_NAME = pd.concat([
+    _FIPS_BY_NAME,
+    pd.Series({alias: _FIPS_BY_NAME[name] for alias, name in NAME_ALIASES.items()}),
+])
+_FIPS_BY_CODE = pd.Series(STATES["state_fips"].to_numpy(), index=STATES["state_code"])
+_CODE_BY_FIPS = pd.Series(STATES["state_code"].to_numpy(), index=STATES["state_fips"].astype(int))
+_NAME_BY_FIPS = pd.Series(STATES["state_name"].to_numpy(), index=STATES["state_fips"].astype(int))
+
+
+def _lookup(values, table: pd.Series, dtype=None) -> pd.Series:
+    """Map every value through `table`; unknown values become missing."""
+    values = values if isinstance(values, pd.Series) else pd.Series(values)
+    out = values.map(table)
+    return out.astype(dtype) if dtype is not None else out
+
+
+# ------------------------------------------------------------
+# States
+# ------------------------------------------------------------
+
+def state_fips_from_name(names) -> pd.Series:
+    """'Alabama' -> 1. Names outside the table (regions, 'United States') -> <NA>."""
+    return _lookup(pd.Series(names).str.strip(), _FIPS_BY_NAME, "Int8")
+
+
+def state_fips_from_code(codes) -> pd.Series:
+    """'AL' -> 1."""
+    return _lookup(pd.Series(codes).str.strip(), _FIPS_BY_CODE, "Int8")
+
+
+def state_code(state_fips) -> pd.Series:
+    """1 -> 'AL'. Accepts integer FIPS or their string forms ('1', '01')."""
+    return _lookup(pd.to_numeric(pd.Series(state_fips), errors="coerce"), _CODE_BY_FIPS)
+
+
+def state_name(state_fips) -> pd.Series:
+    """1 -> 'Alabama'."""
+    return _lookup(pd.to_numeric(pd.Series(state_fips), errors="coerce"), _NAME_BY_FIPS)
+
+
+def state_code_from_name(names) -> pd.Series:
+    """'Alabama' -> 'AL'."""
+    return state_code(state_fips_from_name(names))
+
+
+def is_territory(state_fips) -> pd.Series:
+    return pd.Series(state_fips).isin(TERRITORIES)
+
+
+# ------------------------------------------------------------
+# Counties
+# ------------------------------------------------------------
+
+def county_fips(statefips, countyfips) -> pd.Series:
+    """Integer county key: state * 1000 + county (e.g. 1001 for Autauga, AL)."""
+    return (pd.Series(statefips).astype("int32") * 1000 + pd.Series(countyfips).astype("int32")).rename("county_fips")
+
+
+def county_fips_from_geoid(geoid) -> pd.Series:
+    """Census GEOID ('01001', or already numeric) -> 1001."""
+    return pd.to_numeric(pd.Series(geoid), errors="raise").astype("int32").rename("county_fips")
+
+
+def county_state(county_fips) -> pd.Series:
+    """1001 -> 1."""
+    return (pd.Series(county_fips) // 1000).astype("int8")
+
+
+def county_part(county_fips) -> pd.Series:
+    """1001 -> 1 (the three-digit county code within the state)."""
+    return (pd.Series(county_fips) % 1000).astype("int16")
+
+
+def fips5(county_fips) -> pd.Series:
+    """1001 -> '01001', for display and for files that expect the Census string."""
+    return pd.Series(county_fips).astype(int).astype(str).str.zfill(5)
+
+
+# ------------------------------------------------------------
+# CoCs
+# ------------------------------------------------------------
+
+def coc_categorical(codes, categories: Optional[Iterable[str]] = None) -> pd.Series:
+    """CoC codes ('AL-500') as a categorical, with sorted categories by default."""
+    codes = pd.Series(codes, dtype=object).str.strip()
+    if categories is None:
+        categories = np.sort(codes.dropna().unique())
+    return codes.astype(pd.CategoricalDtype(categories))
+
+
+def coc_state_code(codes) -> pd.Series:
+    """'AL-500' -> 'AL', computed once per distinct CoC."""
+    codes = pd.Series(codes)
+    if not isinstance(codes.dtype, pd.CategoricalDtype):
+        codes = coc_categorical(codes)
+    states = codes.cat.categories.str.split("-").str[0].str.strip()
+    return pd.Series(np.asarray(states, dtype=object)[codes.cat.codes], index=codes.index).where(codes.notna())
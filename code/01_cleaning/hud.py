@@ -0,0 +1,244 @@
+"""
+Title: hud.py
+HUD System Performance Measures workbook (HUD.xlsx) as one long CoC-year table.
+
+Every year sheet has a title row, then the header row, then one row per CoC.
+The workbook is opened in openpyxl's streaming read-only mode and only the
+columns in RENAME are pulled from each sheet; with more than one worker the
+year sheets are streamed in parallel, each process opening its own read-only
+handle. The typed result is cached under data/02_cleaned/cache, keyed by the
+workbook hash.
+
+clean_coc_year applies the cleaning rules once and build_hud_coc_year (the hud
+stage) persists the result (hud_coc_year.parquet + HUD_only.csv); the later
+stages only read it back with load_hud_coc_year. The CoC-level build uses it
+as is and the state-level build aggregates it with state_year, so both final
+datasets come from the same table.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from cache import cache_key, cache_path, prune, temp_path
+from config import HUD_DATA, HUD_CLEAN, HUD_COC_YEAR, CACHE_DIR
+from geography import coc_state_code
+from schema import compact, write_csv
+
+N_WORKERS = os.cpu_count()
+
+RENAME = {
+    "Continuum of Care (CoC)": "coc_name",
+    "HUD CoC Number": "coc_code",
+    "ES-SH-TH-PH 1st Time Homeless": "inflow",
+    "ES-SH-TH Avg (Days)": "avg_days_homeless",
+    "ES-SH-TH Median (Days)": "median_days_homeless",
+    "Percent with Successful  ES, TH, SH, PH-RRH Exit": "success_rate",
+    "Total Persons Exiting ES, TH, SH, PH-RRH": "exits",
+    "Total Persons Exiting ES, TH, SH, PH-RRH to Permanent Housing": "exits_perm",
+    "Total Non-DV Beds on 2015 HIC ES+TH": "beds_2015",
+    "2015 Bed coverage Percent on HMIS for ES-TH Combined": "bed_coverage_pct",
+}
+TEXT_COLS = ["coc_name", "coc_code"]
+# Erroneous observations, dropped after the missing-years check
+# (NY-511 in 2016 had a negative success rate)
+DROP_OBS = [("NY-511", 2016)]
+# CoC-year -> state-year collapse
+STATE_AGG = {
+    "inflow": "sum",
+    "avg_days_homeless": "mean",
+    "median_days_homeless": "mean",
+    "exits": "sum",
+    "exits_perm": "sum",
+}
+NUM_COLS = [c for c in RENAME.values() if c not in TEXT_COLS]
+# Kept as read by the original cleaning; coerced now because the typed table
+# (Parquet, float32 schema) needs one dtype per column. typed() reports any
+# text these lose.
+COERCED_2015 = ["beds_2015", "bed_coverage_pct"]
+
+
+def year_sheets(sheet_names: List[str]) -> Dict[int, str]:
+    """Year -> sheet for every sheet after the first whose name is a year."""
+    sheets = {}
+    for sheet in sheet_names[1:]:
+        try:
+            sheets[int(sheet)] = sheet
+        except ValueError:
+            print(f"Skipping non-year sheet: {sheet}")
+    return sheets
+
+
+def read_sheet_rows(ws, year: int) -> pd.DataFrame:
+    """Stream one worksheet, keeping only the RENAME columns (header on row 2)."""
+    # Read-only sheets trust the stored <dimension> tag, which some writers
+    # leave stale; without this rows past it are silently dropped
+    if hasattr(ws, "reset_dimensions"):
+        ws.reset_dimensions()
+    rows = ws.iter_rows(values_only=True)
+    next(rows, None)
+    header = next(rows, ())
+    header = [h.strip() if isinstance(h, str) else h for h in header]
+
+    # First occurrence of each wanted header -> column position
+    positions = {}
+    for i, name in enumerate(header):
+        if name in RENAME and RENAME[name] not in positions:
+            positions[RENAME[name]] = i
+
+    data = {col: [] for col in positions}
+    for row in rows:
+        # Blank spacer/footer rows
+        if all(v is None for v in row):
+            continue
+        for col, i in positions.items():
+            data[col].append(row[i] if i < len(row) else None)
+
+    df = pd.DataFrame(data)
+    df["year"] = year
+    return df
+
+
+def read_sheet(path: Path, sheet: str, year: int) -> pd.DataFrame:
+    """One year sheet from its own read-only workbook handle (for worker processes)."""
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        return read_sheet_rows(wb[sheet], year)
+    finally:
+        wb.close()
+
+
+def typed(df: pd.DataFrame) -> pd.DataFrame:
+    """Text columns as str (missing kept), measures numeric ("N/A" -> NaN), year as int."""
+    for col in RENAME.values():
+        if col not in df.columns:
+            df[col] = None
+    for col in TEXT_COLS:
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str)).astype(object)
+    for col in COERCED_2015:
+        lost = df[col].notna() & pd.to_numeric(df[col], errors="coerce").isna()
+        if lost.any():
+            print(f"[WARNING] {col}: {lost.sum()} non-numeric values set to missing "
+                  f"(e.g. {df.loc[lost, col].iloc[0]!r})")
+    df[NUM_COLS] = df[NUM_COLS].apply(pd.to_numeric, errors="coerce")
+    df["year"] = df["year"].astype(int)
+    return df[list(RENAME.values()) + ["year"]]
+
+
+def read_hud(path: Path = HUD_DATA, n_workers: Optional[int] = N_WORKERS) -> pd.DataFrame:
+    """Long CoC-year table with the RENAME columns from every year sheet."""
+    key = cache_key(path, columns=list(RENAME))
+    cached = cache_path("hud_long", key)
+    if cached.exists():
+        print(f"Loading cached HUD table ({key})")
+        return pd.read_parquet(cached)
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheets = year_sheets(wb.sheetnames)
+        print(f"Reading HUD sheets {min(sheets)}-{max(sheets)} ({len(sheets)} sheets)")
+        if n_workers is None or n_workers <= 1:
+            frames = [read_sheet_rows(wb[sheet], year) for year, sheet in sheets.items()]
+    finally:
+        wb.close()
+
+    if n_workers is not None and n_workers > 1:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(sheets))) as pool:
+            frames = list(pool.map(read_sheet, [path] * len(sheets), sheets.values(), sheets.keys()))
+
+    df = typed(pd.concat(frames, ignore_index=True))
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = temp_path(cached)
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, cached)
+    prune("hud_long", keep=cached)
+    return df
+
+
+# ------------------------------------------------------------
+# Cleaned CoC-year artifact
+# ------------------------------------------------------------
+
+def clean_coc_year(df: pd.DataFrame) -> pd.DataFrame:
+    df = df[TEXT_COLS + ["year"] + NUM_COLS].dropna(subset=["coc_code"])
+
+    # Drop CoCs missing years
+    years_per_coc = df.groupby("coc_code", observed=True)["year"].count()
+    missings = years_per_coc[years_per_coc < df["year"].nunique()]
+
+    if not missings.empty:
+        print("[WARNING] Dropping CoCs with missing years:")
+        print(missings)
+        df = df[~df["coc_code"].isin(missings.index)]
+
+    drop = pd.MultiIndex.from_tuples(DROP_OBS, names=["coc_code", "year"])
+    df = df[~pd.MultiIndex.from_frame(df[["coc_code", "year"]]).isin(drop)]
+    return df.reset_index(drop=True)
+
+
+def _replace_with(path: Path, write) -> None:
+    """Write `path` through a per-process temp file, then rename it into place."""
+    tmp = temp_path(path)
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def build_hud_coc_year(path: Path = HUD_DATA) -> pd.DataFrame:
+    """Build and persist the cleaned CoC-year table (the hud stage).
+
+    Skipped when HUD.xlsx is unchanged and both copies exist. Each file is
+    written atomically, the key last, so a stopped build is never taken for
+    a finished one.
+    """
+    key = cache_key(path, columns=list(RENAME), drop=DROP_OBS)
+    key_file = HUD_COC_YEAR.with_suffix(".key")
+    if HUD_COC_YEAR.exists() and key_file.exists() and key_file.read_text() == key:
+        df = compact(pd.read_parquet(HUD_COC_YEAR), "hud_coc_year")
+        # The CSV copy is an output too; restore it if it was removed
+        if not HUD_CLEAN.exists():
+            _replace_with(HUD_CLEAN, lambda tmp: write_csv(df, tmp, name=HUD_CLEAN.stem))
+            print(f"Rewrote {HUD_CLEAN.name} from the cached table")
+        print(f"Cleaned HUD CoC-year table is up to date ({HUD_COC_YEAR})")
+        return df
+
+    df = compact(clean_coc_year(read_hud(path)), "hud_coc_year")
+    _replace_with(HUD_COC_YEAR, lambda tmp: df.to_parquet(tmp, index=False))
+    _replace_with(HUD_CLEAN, lambda tmp: write_csv(df, tmp, name=HUD_CLEAN.stem))
+    _replace_with(key_file, lambda tmp: tmp.write_text(key))
+    print(f"Wrote cleaned HUD CoC-year table ({len(df)} rows) to {HUD_COC_YEAR}")
+    return df
+
+
+def load_hud_coc_year() -> pd.DataFrame:
+    """The cleaned CoC-year table written by the hud stage (never rebuilt here)."""
+    if not HUD_COC_YEAR.exists():
+        raise FileNotFoundError(
+            f"{HUD_COC_YEAR} not found; build it first with python hud.py "
+            "(or python master_clean.py --only hud)"
+        )
+    print(f"Loading cleaned HUD CoC-year table from {HUD_COC_YEAR}")
+    return compact(pd.read_parquet(HUD_COC_YEAR), "hud_coc_year")
+
+
+def state_year(df: pd.DataFrame) -> pd.DataFrame:
+    """Collapse CoC-years to state-years over CoCs observed in every year."""
+    years_per_coc = df.groupby("coc_code", observed=True)["year"].transform("count")
+    df = df[years_per_coc == df["year"].nunique()]
+
+    df = df.assign(state=coc_state_code(df["coc_code"]))
+    return df.groupby(["state", "year"], observed=True).agg(STATE_AGG).reset_index()
+
+
+def main():
+    build_hud_coc_year()
+
+
+if __name__ == "__main__":
+    main()
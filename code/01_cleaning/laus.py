@@ -0,0 +1,80 @@
+"""
+Title: laus.py
+BLS LAUS county annual averages (laucntyYY.xlsx), shared by the county and
+state control stages. Workbooks are discovered from the UNEMP folder and parsed
+concurrently; the result is one long county-year table.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+from cache import read_excel
+from config import UNEMP
+
+N_WORKERS = os.cpu_count()
+LAUS_FILE = re.compile(r"laucnty(\d{2})\.xlsx$")
+
+RENAME = {
+    "State FIPS Code": "statefips",
+    "County FIPS Code": "countyfips",
+    "Labor Force": "labor_force",
+    "Unemployed": "unemployed",
+    "Unemployment Rate (%)": "unemp_rate",
+}
+
+
+def laus_files(unemp_dir: Path = UNEMP) -> Dict[int, Path]:
+    """Year -> workbook for every laucntyYY.xlsx in the folder."""
+    files = {}
+    for path in Path(unemp_dir).iterdir():
+        m = LAUS_FILE.match(path.name)
+        if m:
+            files[2000 + int(m.group(1))] = path
+    return dict(sorted(files.items()))
+
+
+def read_laus(path: Path, year: int) -> pd.DataFrame:
+    """One workbook -> county rows with integer FIPS and numeric counts/rate."""
+    df = read_excel(path, sheet_name=Path(path).stem, skiprows=1)
+    df = df.rename(columns=RENAME)[list(RENAME.values())]
+
+    # Footnote rows at the bottom have no FIPS codes
+    df = df.dropna(subset=["statefips", "countyfips"])
+    df["statefips"] = df["statefips"].astype(int)
+    df["countyfips"] = df["countyfips"].astype(int)
+
+    # "N.A." and other placeholders -> NaN
+    for col in ["labor_force", "unemployed", "unemp_rate"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    df.insert(0, "year", year)
+    return df
+
+
+def read_laus_years(
+    unemp_dir: Path = UNEMP,
+    years: Optional[Iterable[int]] = None,
+    n_workers: Optional[int] = N_WORKERS,
+) -> pd.DataFrame:
+    """Parse every LAUS workbook (optionally only `years`) on a process pool."""
+    files = laus_files(unemp_dir)
+    if years is not None:
+        files = {y: p for y, p in files.items() if y in set(years)}
+    if not files:
+        raise FileNotFoundError(f"No laucntyYY.xlsx workbooks found in {unemp_dir}")
+
+    print(f"Reading LAUS workbooks for {min(files)}-{max(files)} ({len(files)} files)")
+    if n_workers is None or n_workers <= 1:
+        frames = list(map(read_laus, files.values(), files.keys()))
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(files))) as pool:
+            frames = list(pool.map(read_laus, files.values(), files.keys()))
+
+    return pd.concat(frames, ignore_index=True)
@@ -2,27 +2,182 @@
 Title: master_clean.py
 Author: Mary Edith Plunkett
 Updated: 2026-02
+
+Runs the cleaning stages declared in stages.py, skipping stages whose inputs
+and outputs are unchanged since their last successful run.
+
+Each stage runs as its own process (python <stage script>), with its output
+going to data/02_cleaned/logs/<stage>.log. A stage starts as soon as every
+stage it depends on has finished, up to --jobs at a time, so the crosswalk,
+state controls, policy panel and HUD table all start together and the
+merges wait for their inputs.
+
+    python master_clean.py                      # run whatever is out of date
+    python master_clean.py --force              # rerun every stage
+    python master_clean.py --only policy_panel  # rerun one stage (repeatable)
+    python master_clean.py --from hud           # rerun a stage and everything downstream
+    python master_clean.py --jobs 1             # one stage at a time
+    python master_clean.py --profile hud_merge  # cProfile one stage (see code/perf.py)
+    python master_clean.py --memory-budget 500  # fail a stage whose frames exceed 500 MB
+
+Every stage runs under code/perf.py; the run report (time, CPU, memory, I/O
+and merge row counts per stage) is written to output/perf/run-<run id>.json.
 '''
 
-from clean_01_CoC_crosswalk import main as stage1
-from clean_02_county_controls import main as stage2
-from clean_03_policy_panel import main as stage3
-from clean_04_HUD_data import main as stage4
+import argparse
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from config import CODE_DIR, LOG_DIR
+from schema import BUDGET_ENV
+from stages import (CODE, STAGES, STAGE_NAMES, StageState, dependencies, downstream, get_stage,
+                    missing_outputs)
+
+sys.path.append(str(CODE_DIR))
+import perf
+
+# Stages running at once; the crosswalk, LAUS/COVID and HUD reads use process pools of their own
+MAX_JOBS = 4
+LOG_TAIL = 20
+
+
+def select_stages(only=None, start=None):
+    """(stages to consider, stages to run regardless of their hashes)."""
+    if only:
+        names = [get_stage(n).name for n in only]
+        return [s for s in STAGES if s.name in names], set(names)
+    if start:
+        names = downstream(get_stage(start).name)
+        return [s for s in STAGES if s.name in names], set(names)
+    return list(STAGES), set()
+
+
+def run_stage(stage, run_id):
+    """Run one stage script under perf.py in a fresh interpreter; returns (exit code, seconds)."""
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    cmd = [sys.executable, "-u", perf.__file__, "--run-id", run_id, "--name", stage.name, "--no-report",
+           str(CODE / f"{stage.module}.py")]
+    t0 = time.perf_counter()
+    with open(LOG_DIR / f"{stage.name}.log", "w") as log:
+        proc = subprocess.run(cmd, cwd=CODE, stdout=log, stderr=subprocess.STDOUT)
+    return proc.returncode, time.perf_counter() - t0
+
+
+def print_log_tail(stage, n=LOG_TAIL):
+    lines = (LOG_DIR / f"{stage.name}.log").read_text(errors="replace").splitlines()
+    print("\n".join("    " + line for line in lines[-n:]))
+
+
+def main(force=False, only=None, start=None, jobs=MAX_JOBS, profile=None, memory_budget=None):
+    jobs = max(jobs, 1)
+    run_id = os.environ.get(perf.RUN_ID_ENV) or perf.new_run_id()
+    if profile:
+        os.environ[perf.PROFILE_ENV] = profile
+    if memory_budget:
+        # Read by schema.check_frame in every stage process
+        os.environ[BUDGET_ENV] = str(memory_budget)
+    status = {}
+    stages, forced = select_stages(only, start)
+    selected = {s.name for s in stages}
+    # Only dependencies inside the selection are waited on
+    waits_on = {s.name: set(dependencies(s)) & selected for s in stages}
+
+    state = StageState()
+    pending = list(stages)
+    finished, failed = set(), set()
+    running = {}
+    t_start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            # Dependants of a failed stage never start
+            for stage in [s for s in pending if waits_on[s.name] & failed]:
+                print(f"[SKIP] {stage.name}: upstream stage failed")
+                status[stage.name] = {"status": "not run", "reason": "upstream stage failed"}
+                pending.remove(stage)
+                failed.add(stage.name)
+
+            for stage in [s for s in pending if waits_on[s.name] <= finished]:
+                if len(running) >= jobs:
+                    break
+                pending.remove(stage)
+                inputs = state.stage_inputs(stage)
+                missing = [p for p, d in inputs.items() if d is None]
+                if missing:
+                    print(f"[FAIL] {stage.name}: missing inputs {', '.join(missing)}")
+                    status[stage.name] = {"status": "failed", "reason": "missing inputs: " + ", ".join(missing)}
+                    failed.add(stage.name)
+                    continue
+
+                reason = "forced" if force or stage.name in forced else state.stale_reason(stage, inputs)
+                if reason is None:
+                    print(f"[SKIP] {stage.name}: up to date")
+                    status[stage.name] = {"status": "up to date"}
+                    finished.add(stage.name)
+                    continue
+
+                print(f"[RUN] {stage.title} ({stage.name}): {reason}")
+                status[stage.name] = {"status": "running", "reason": reason}
+                running[pool.submit(run_stage, stage, run_id)] = (stage, inputs)
+
+            if not running:
+                continue
+
+            # Join point: block until some stage finishes, then see what it unblocked
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, inputs = running.pop(future)
+                code, seconds = future.result()
+                # Exiting 0 is not enough: every declared output must be there
+                missing = missing_outputs(stage) if code == 0 else []
+                status[stage.name]["status"] = "ok" if code == 0 and not missing else "failed"
+                if code == 0 and not missing:
+                    state.record(stage, inputs)
+                    finished.add(stage.name)
+                    print(f"[DONE] {stage.name} in {seconds:.1f}s")
+                elif missing:
+                    failed.add(stage.name)
+                    status[stage.name]["reason"] = "outputs not written: " + ", ".join(missing)
+                    print(f"[FAIL] {stage.name} exited with 0 after {seconds:.1f}s but did not write "
+                          f"{', '.join(missing)} (log: {LOG_DIR / f'{stage.name}.log'})")
+                else:
+                    failed.add(stage.name)
+                    print(f"[FAIL] {stage.name} exited with {code} after {seconds:.1f}s "
+                          f"(log: {LOG_DIR / f'{stage.name}.log'})")
+                    print_log_tail(stage)
 
-def main():
-    print("[STAGE 1] CoC-County Crosswalk")
-    stage1()
+    if perf.run_dir(run_id).exists():
+        print(f"\nRun report: {perf.write_report(run_id, {'stages': status})}")
 
-    print("\n[STAGE 2] County-Level Data")
-    stage2()
+    if failed:
+        print(f"\n[FAILED] {', '.join(n for n in STAGE_NAMES if n in failed)}")
+        return 1
+    print(f"\n[ALL DONE] All cleaning stages complete in {time.perf_counter() - t_start:.1f}s!")
+    return 0
 
-    print("\n[STAGE 3] State Policy Panel")
-    stage3()
 
-    print("\n[STAGE 4] HUD Data and Merging")   
-    stage4()
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the cleaning pipeline.")
+    parser.add_argument("--force", action="store_true", help="rerun stages even if up to date")
+    parser.add_argument("--only", action="append", choices=STAGE_NAMES, metavar="STAGE",
+                        help=f"run just this stage (repeatable); one of {', '.join(STAGE_NAMES)}")
+    parser.add_argument("--from", dest="start", choices=STAGE_NAMES, metavar="STAGE",
+                        help="run this stage and every stage downstream of it")
+    parser.add_argument("--jobs", type=int, default=MAX_JOBS, help=f"stages run at once (default {MAX_JOBS})")
+    parser.add_argument("--profile", metavar="STAGE[,STAGE]",
+                        help="profile these stages (cProfile; DMP_PROFILER=sample for the sampling profiler)")
+    parser.add_argument("--memory-budget", type=float, metavar="MB",
+                        help=f"largest frame a stage may build, in MB (default: ${BUDGET_ENV}, unlimited)")
+    args = parser.parse_args(argv)
+    if args.only and args.start:
+        parser.error("--only and --from cannot be combined")
+    return args
 
-    print("\n[ALL DONE] All cleaning stages complete!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    sys.exit(main(force=args.force, only=args.only, start=args.start, jobs=args.jobs, profile=args.profile,
+                  memory_budget=args.memory_budget))
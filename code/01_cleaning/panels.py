@@ -0,0 +1,38 @@
+"""
+Title: panels.py
+Final analysis panels on disk.
+
+Each panel is written twice: the Stata file for Stata users (all_data.dta,
+all_state_data.dta) and a zstd-compressed Parquet dataset partitioned by year
+(all_data/year=2016/..., all_state_data/year=2016/...). The analysis scripts
+read the Parquet copy through config.load_panel, which only touches the
+columns and years they ask for.
+"""
+
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+from schema import compact, for_stata
+
+COMPRESSION = "zstd"
+
+
+def parquet_dir(dta_path: Path) -> Path:
+    """all_data.dta -> all_data/ (the partitioned Parquet copy next to it)."""
+    return Path(dta_path).with_suffix("")
+
+
+def write_panel(df: pd.DataFrame, dta_path: Path) -> None:
+    df = compact(df, Path(dta_path).stem)
+    for_stata(df).to_stata(dta_path)
+
+    out = parquet_dir(dta_path)
+    # Rewrite from scratch so years dropped from the panel do not linger
+    if out.exists():
+        shutil.rmtree(out)
+    df.reset_index(drop=True).to_parquet(out, partition_cols=["year"], compression=COMPRESSION, index=False)
+    print(f"Wrote {dta_path.name} and year-partitioned Parquet copy {out.name}/")
@@ -0,0 +1,149 @@
+"""
+Title: policy_cube.py
+Daily policy status as a bit-packed state x policy x day array.
+
+The cube is written by clean_03_policy_panel next to policy_panel.csv:
+policy_cube.npy holds the bits (one uint8 per 8 days, packed along the day
+axis) and policy_cube.json the index (state codes, policy names, first day,
+number of days). PolicyCube.open memory-maps the bits, so downstream scripts
+can compute any exposure window without rebuilding the panel:
+
+    cube = PolicyCube.open(POLICY_CUBE)
+    cube.window_sum("overall_active", "2020-03-01", "2020-12-31")  # days per state
+    cube.cumulative("overall_active", "2021-06-30")                 # days up to a date
+    cube.lagged_sums("overall_active", dates, window=90, lag=30)    # per state x date
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+DateLike = Union[str, pd.Timestamp]
+
+
+def daily_status(intervals: pd.DataFrame, states: Sequence[str], policies: Sequence[str],
+                 start: pd.Timestamp, end: pd.Timestamp) -> np.ndarray:
+    """Boolean (state, policy, day) array from merged day intervals."""
+    n_days = (end.normalize() - start.normalize()).days + 1
+    s_idx = pd.Index(states).get_indexer(intervals["state_code"])
+    p_idx = pd.Index(policies).get_indexer(intervals["policy"])
+    keep = (s_idx >= 0) & (p_idx >= 0)
+
+    first = ((intervals["start"] - start.normalize()).dt.days.to_numpy())[keep]
+    last = ((intervals["end"] - start.normalize()).dt.days.to_numpy())[keep]
+
+    # +1 at the first day, -1 after the last day; a running sum marks active days
+    diff = np.zeros((len(states), len(policies), n_days + 1), dtype=np.int16)
+    np.add.at(diff, (s_idx[keep], p_idx[keep], first), 1)
+    np.add.at(diff, (s_idx[keep], p_idx[keep], last + 1), -1)
+    return np.cumsum(diff[..., :n_days], axis=-1) > 0
+
+
+class PolicyCube:
+    """Memory-mapped daily policy status with windowed and prefix-sum queries."""
+
+    def __init__(self, bits: np.ndarray, states: List[str], policies: List[str],
+                 start: pd.Timestamp, n_days: int):
+        self.bits = bits
+        self.states = pd.Index(states)
+        self.policies = list(policies)
+        self.start = pd.Timestamp(start)
+        self.n_days = n_days
+        self.dates = pd.date_range(self.start, periods=n_days, freq="D")
+        self._prefix: Dict[str, np.ndarray] = {}
+
+    # ---------------- building / IO ----------------
+
+    @classmethod
+    def build(cls, intervals: pd.DataFrame, states: Sequence[str], policies: Sequence[str],
+              start: pd.Timestamp, end: pd.Timestamp) -> "PolicyCube":
+        status = daily_status(intervals, states, policies, start, end)
+        bits = np.packbits(status, axis=-1)
+        return cls(bits, list(states), list(policies), start.normalize(), status.shape[-1])
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        out = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=self.bits.shape)
+        out[:] = self.bits
+        out.flush()
+        del out
+        index = {
+            "states": list(self.states),
+            "policies": self.policies,
+            "start": self.start.strftime("%Y-%m-%d"),
+            "n_days": self.n_days,
+        }
+        path.with_suffix(".json").write_text(json.dumps(index, indent=2))
+
+    @classmethod
+    def open(cls, path: Path) -> "PolicyCube":
+        path = Path(path)
+        index = json.loads(path.with_suffix(".json").read_text())
+        bits = np.load(path, mmap_mode="r")
+        return cls(bits, index["states"], index["policies"], pd.Timestamp(index["start"]), index["n_days"])
+
+    # ---------------- lookups ----------------
+
+    def day(self, date: DateLike) -> int:
+        """Position of `date` in the cube (can fall outside [0, n_days))."""
+        return (pd.Timestamp(date).normalize() - self.start).days
+
+    def _states(self, states: Optional[Sequence[str]]) -> np.ndarray:
+        if states is None:
+            return np.arange(len(self.states))
+        idx = self.states.get_indexer(states)
+        if (idx < 0).any():
+            raise KeyError(f"Unknown states: {list(np.asarray(states)[idx < 0])}")
+        return idx
+
+    def status(self, policy: str, states: Optional[Sequence[str]] = None) -> np.ndarray:
+        """Unpacked (state, day) 0/1 array for one policy."""
+        p = self.policies.index(policy)
+        packed = self.bits[self._states(states), p, :]
+        return np.unpackbits(packed, axis=-1, count=self.n_days)
+
+    def prefix(self, policy: str) -> np.ndarray:
+        """(state, n_days + 1) running count of active days; prefix[:, t] = days before t."""
+        if policy not in self._prefix:
+            counts = np.cumsum(self.status(policy), axis=-1, dtype=np.int32)
+            self._prefix[policy] = np.concatenate(
+                [np.zeros((len(self.states), 1), dtype=np.int32), counts], axis=-1
+            )
+        return self._prefix[policy]
+
+    # ---------------- queries ----------------
+
+    def window_sum(self, policy: str, start: DateLike, end: DateLike,
+                   states: Optional[Sequence[str]] = None) -> pd.Series:
+        """Days active in [start, end] per state (days outside the cube count as inactive)."""
+        lo = np.clip(self.day(start), 0, self.n_days)
+        hi = np.clip(self.day(end) + 1, 0, self.n_days)
+        idx = self._states(states)
+        pre = self.prefix(policy)
+        days = pre[idx, max(hi, lo)] - pre[idx, lo]
+        return pd.Series(days, index=self.states[idx], name=policy)
+
+    def cumulative(self, policy: str, date: DateLike,
+                   states: Optional[Sequence[str]] = None) -> pd.Series:
+        """Days active from the start of the cube through `date`."""
+        return self.window_sum(policy, self.start, date, states)
+
+    def lagged_sums(self, policy: str, dates: Sequence[DateLike], window: int, lag: int = 0,
+                    states: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Days active in the `window` days ending `lag` days before each date.
+
+        lag=0, window=1 is the status on the date itself; a negative lag gives leads.
+        Returns a state x date frame.
+        """
+        last = np.array([self.day(d) for d in dates]) - lag
+        hi = np.clip(last + 1, 0, self.n_days)
+        lo = np.clip(last + 1 - window, 0, self.n_days)
+        idx = self._states(states)
+        pre = self.prefix(policy)[idx]
+        days = pre[:, np.maximum(hi, lo)] - pre[:, lo]
+        return pd.DataFrame(days, index=self.states[idx], columns=pd.DatetimeIndex(dates))
@@ -0,0 +1,151 @@
+"""
+Title: policy_intervals.py
+Policy windows as date intervals.
+
+Each (state, policy) row of the moratoria dataset is a [first date of effect,
+expiration] interval. Intervals are clipped to the study window, overlapping
+or adjacent windows of the same state and policy are merged, and day counts
+for any period frequency (year, quarter, month) come straight from the
+interval bounds, without building a state x day skeleton.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+US_DATE_FORMATS = ("%m/%d/%Y", "%m/%d/%y")
+ONE_DAY = pd.Timedelta(days=1)
+
+
+# ------------------------------------------------------------
+# Dates
+# ------------------------------------------------------------
+
+def parse_us_dates(values: pd.DataFrame) -> pd.DataFrame:
+    """Parse every cell of `values` (MM/DD/YYYY, MM/DD/YY, Excel dates, or any
+    other format pandas recognises) to a Timestamp. Each distinct value is
+    parsed once; unparseable values become NaT."""
+    cells = pd.Series(values.to_numpy(dtype=object).ravel())
+    uniques = pd.Series(pd.unique(cells.dropna()), dtype=object)
+
+    is_date = uniques.map(lambda x: isinstance(x, (pd.Timestamp, datetime))).astype(bool)
+    parsed = pd.Series(pd.NaT, index=uniques.index, dtype="datetime64[ns]")
+    parsed[is_date] = pd.to_datetime(uniques[is_date].tolist())
+
+    text = uniques[~is_date].astype(str).str.strip()
+    text = text[text != ""]
+    for fmt in US_DATE_FORMATS:
+        todo = text.index[parsed[text.index].isna()]
+        parsed[todo] = pd.to_datetime(text[todo], format=fmt, errors="coerce")
+
+    # Anything left (e.g. "March 4, 2021") goes through pandas' own inference
+    for i in text.index[parsed[text.index].isna()]:
+        parsed[i] = pd.to_datetime(text[i], errors="coerce")
+
+    lookup = pd.Series(parsed.to_numpy(), index=uniques.to_numpy())
+    return values.apply(lambda col: col.map(lookup).astype("datetime64[ns]"))
+
+
+# ------------------------------------------------------------
+# Intervals
+# ------------------------------------------------------------
+
+def merge_intervals(intervals: pd.DataFrame, by: List[str]) -> pd.DataFrame:
+    """Union of overlapping or adjacent [start, end] day intervals within each `by` group."""
+    iv = intervals.sort_values(by + ["start"]).reset_index(drop=True)
+    keys = [iv[c] for c in by]
+
+    # Latest end seen so far in the group, up to the previous row
+    reach = iv.groupby(keys, sort=False)["end"].cummax()
+    prev = reach.groupby(keys, sort=False).shift()
+    run = (prev.isna() | (iv["start"] > prev + ONE_DAY)).cumsum()
+
+    merged = iv.groupby(run).agg({**{c: "first" for c in by}, "start": "min", "end": "max"})
+    return merged.reset_index(drop=True)
+
+
+def policy_intervals(
+    df: pd.DataFrame,
+    columns: Dict[str, Tuple[str, str]],
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    key: str = "state_code",
+) -> pd.DataFrame:
+    """Long (key, policy, start, end) table of merged day intervals within [start, end].
+
+    A missing start means the policy never took effect; a missing end means it
+    was still in force at `end`.
+    """
+    frames = [
+        pd.DataFrame({key: df[key], "policy": policy, "start": df[s_col], "end": df[e_col]})
+        for policy, (s_col, e_col) in columns.items()
+    ]
+    iv = pd.concat(frames, ignore_index=True).dropna(subset=["start"])
+
+    # Whole days only: a window starting mid-day counts from the next day
+    iv["start"] = iv["start"].clip(lower=start).dt.ceil("D")
+    iv["end"] = iv["end"].fillna(end).clip(upper=end).dt.floor("D")
+    iv = iv[iv["end"] >= iv["start"]]
+
+    return merge_intervals(iv, [key, "policy"])
+
+
+# ------------------------------------------------------------
+# Period day counts
+# ------------------------------------------------------------
+
+def period_bounds(freq: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    """First and last day of every period of `freq` in [start, end], clipped to the window."""
+    periods = pd.period_range(start, end, freq=freq)
+    return pd.DataFrame({
+        "period": periods,
+        "period_start": np.maximum(periods.start_time.normalize(), start.normalize()),
+        "period_end": np.minimum(periods.end_time.normalize(), end.normalize()),
+    })
+
+
+def period_exposure(
+    intervals: pd.DataFrame,
+    freq: str,
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    by: Sequence[str] = ("state_code", "policy"),
+) -> pd.DataFrame:
+    """Days active and first/last active day per `by` group and period.
+
+    Each merged interval is split at period boundaries; the pieces never
+    overlap, so days add up exactly.
+    """
+    by = list(by)
+    bounds = period_bounds(freq, start, end)
+    p_start = bounds["period_start"].to_numpy()
+    p_end = bounds["period_end"].to_numpy()
+
+    s = intervals["start"].to_numpy(dtype="datetime64[ns]")
+    e = intervals["end"].to_numpy(dtype="datetime64[ns]")
+    first = np.searchsorted(p_start, s, side="right") - 1
+    last = np.searchsorted(p_start, e, side="right") - 1
+    n = last - first + 1
+
+    # One row per (interval, period it touches)
+    rows = np.repeat(np.arange(len(intervals)), n)
+    offset = np.arange(len(rows)) - np.repeat(np.cumsum(n) - n, n)
+    pidx = first[rows] + offset
+
+    piece_start = np.maximum(s[rows], p_start[pidx])
+    piece_end = np.minimum(e[rows], p_end[pidx])
+
+    pieces = intervals[by].iloc[rows].reset_index(drop=True)
+    pieces["period"] = bounds["period"].to_numpy()[pidx]
+    pieces["days"] = (piece_end - piece_start) // np.timedelta64(1, "D") + 1
+    pieces["first_active"] = piece_start
+    pieces["last_active"] = piece_end
+
+    return (
+        pieces.groupby(by + ["period"], as_index=False)
+        .agg(days=("days", "sum"), first_active=("first_active", "min"), last_active=("last_active", "max"))
+    )
@@ -0,0 +1,162 @@
+"""
+Title: schema.py
+Compact dtypes for every column the pipeline produces, and a per-stage
+memory budget for the frames it builds.
+
+DTYPES and PATTERNS declare the storage type of each column: small integers
+for years, FIPS codes and policy day counts, float32 for rates and shares,
+categoricals for CoC/state codes and names. Counts that can exceed float32's
+exact range (population, COVID cases) keep float64. The stage 2-4 readers
+and writers go through read_csv / write_csv / compact, so frames come back in
+their compact types whatever the file format stored.
+
+Every frame passing through those helpers is measured (deep memory usage).
+The largest size per frame name is kept in FRAME_PEAKS, which perf.py adds
+to the stage's run record. With DMP_MEMORY_BUDGET_MB set (master_clean
+--memory-budget), a frame over the budget stops the stage with
+MemoryBudgetExceeded.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+BUDGET_ENV = "DMP_MEMORY_BUDGET_MB"
+
+DTYPES: Dict[str, str] = {
+    # keys
+    "year": "int16",
+    "quarter": "int8",
+    "month": "int8",
+    "state_fips": "int8",
+    "statefips": "int8",
+    "countyfips": "int16",
+    "county_fips": "int32",
+    "coc_code": "category",
+    "coc_id": "category",
+    "coc_name": "category",
+    "state_code": "category",
+    "state": "category",
+    # HUD measures
+    "inflow": "float32",
+    "exits": "float32",
+    "exits_perm": "float32",
+    "beds_2015": "float32",
+    "avg_days_homeless": "float32",
+    "median_days_homeless": "float32",
+    "success_rate": "float32",
+    "bed_coverage_pct": "float32",
+    # controls
+    "UNEMP": "float32",
+    "U3": "float32",
+    "SCORECARD": "float32",
+    "ever_treated": "int8",
+}
+
+# Column families (first match wins); exact names in DTYPES take precedence
+PATTERNS: List[Tuple[str, str]] = [
+    (r"_days$", "int16"),     # policy days per period (at most 366 x 14 policies)
+    (r"_share$", "float32"),  # share of the period a policy was active
+]
+
+
+class MemoryBudgetExceeded(MemoryError):
+    pass
+
+
+def dtype_for(column: object) -> Optional[str]:
+    if column in DTYPES:
+        return DTYPES[column]
+    for pattern, dtype in PATTERNS:
+        if isinstance(column, str) and re.search(pattern, column):
+            return dtype
+    return None
+
+
+def _cast(col: pd.Series, dtype: str) -> pd.Series:
+    if dtype == "category":
+        return col if isinstance(col.dtype, pd.CategoricalDtype) else col.astype("category")
+    if not pd.api.types.is_numeric_dtype(col) or pd.api.types.is_bool_dtype(col):
+        return col
+    if np.issubdtype(np.dtype(dtype), np.integer):
+        if col.isna().any():
+            # Missing values: keep them, in the narrowest float
+            return col.astype("float32")
+        info = np.iinfo(dtype)
+        if len(col) and (col.min() < info.min or col.max() > info.max):
+            raise ValueError(f"Column {col.name!r} does not fit {dtype} (range {col.min()}..{col.max()})")
+        if (col % 1 != 0).any():
+            raise ValueError(f"Column {col.name!r} has non-integer values; schema says {dtype}")
+    return col.astype(dtype)
+
+
+def compact(df: pd.DataFrame, name: Optional[str] = None) -> pd.DataFrame:
+    """Cast every column with a schema entry to its compact dtype (and measure the frame)."""
+    casts = {c: dtype_for(c) for c in df.columns}
+    casts = {c: t for c, t in casts.items() if t is not None and str(df[c].dtype) != t}
+    if casts:
+        df = df.assign(**{c: _cast(df[c], t) for c, t in casts.items()})
+    if name is not None:
+        check_frame(df, name)
+    return df
+
+
+def read_csv(path: Path, name: Optional[str] = None, **kwargs) -> pd.DataFrame:
+    """pd.read_csv straight into the schema dtypes (name defaults to the file stem)."""
+    df = pd.read_csv(path, **kwargs)
+    return compact(df, name or Path(path).stem)
+
+
+def write_csv(df: pd.DataFrame, path: Path, name: Optional[str] = None) -> pd.DataFrame:
+    """Compact, measure and write `df`; returns the compacted frame."""
+    df = compact(df, name or Path(path).stem)
+    df.to_csv(path, index=False)
+    return df
+
+
+def for_stata(df: pd.DataFrame) -> pd.DataFrame:
+    """Categoricals back to plain strings (to_stata would write them as labelled integers)."""
+    cats = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    return df.assign(**{c: df[c].astype(object) for c in cats}) if cats else df
+
+
+# ------------------------------------------------------------
+# Memory budget
+# ------------------------------------------------------------
+
+# Largest size seen per frame name in this process (MB)
+FRAME_PEAKS: Dict[str, float] = {}
+
+
+def budget_mb() -> Optional[float]:
+    value = os.environ.get(BUDGET_ENV)
+    return float(value) if value else None
+
+
+def frame_mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(index=True, deep=True).sum() / 2**20
+
+
+def check_frame(df: pd.DataFrame, name: str) -> float:
+    """Record the frame's size and enforce DMP_MEMORY_BUDGET_MB if set."""
+    size = frame_mb(df)
+    FRAME_PEAKS[name] = max(FRAME_PEAKS.get(name, 0.0), round(size, 3))
+    budget = budget_mb()
+    if budget is not None and size > budget:
+        raise MemoryBudgetExceeded(f"Frame {name!r} uses {size:.1f} MB, over the {budget:g} MB budget "
+                                   f"({len(df)} rows x {df.shape[1]} columns)")
+    return size
+
+
+def report() -> None:
+    if not FRAME_PEAKS:
+        return
+    print("\n[MEMORY] Largest frames (MB):")
+    for name, size in sorted(FRAME_PEAKS.items(), key=lambda kv: -kv[1]):
+        print(f"  {name:<32}{size:>10.2f}")
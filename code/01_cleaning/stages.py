@@ -0,0 +1,204 @@
+"""
+Title: stages.py
+The cleaning pipeline as a graph of stages, and the hashes that decide which
+stages need to run.
+
+Every stage names the script (module) it runs and the config paths it reads
+and writes. A stage depends on every stage that writes one of its inputs. The
+code a stage runs is part of its inputs too: its script plus every local
+module the script imports, found by following the imports.
+
+After a stage succeeds its input and output digests are recorded in
+STAGE_STATE. A stage is up to date when its recorded inputs match the current
+ones and its outputs are still on disk unchanged; an upstream stage that
+reruns and writes identical files therefore does not trigger its dependants.
+File digests are reused while a file's size and modification time are
+unchanged, so checking an up-to-date pipeline does not re-read the raw data.
+"""
+
+from __future__ import annotations
+
+import ast
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from cache import source_files, file_digest
+from config import (PROJECT_ROOT, STAGE_STATE, HUD_DATA, COC_VINTAGES, COUNTY_SHP,
+                    COUNTY_POP_2020s, COUNTY_POP_2010s, STATE_POP_10, STATE_POP_20, UNEMP, COVID,
+                    STATE_POLICY, SCORECARD, HUD_CLEAN, HUD_COC_YEAR, CROSSWALK, CROSSWALK_YEARS,
+                    COC_WEIGHTS, COC_POP_WEIGHTS, COUNTY_CLEAN, STATE_CLEAN, COVARIATES, POLICY_PANEL,
+                    POLICY_PANEL_QUARTERLY, POLICY_PANEL_MONTHLY, POLICY_CUBE, ALL_DATA, ALL_STATE_DATA)
+from panels import parquet_dir
+
+CODE = Path(__file__).parent
+
+
+class Stage(NamedTuple):
+    name: str
+    title: str
+    module: str
+    inputs: List[Path]
+    outputs: List[Path]
+
+
+# In run order; dependencies come from matching outputs to inputs
+STAGES = [
+    Stage("crosswalk", "CoC-County Crosswalk", "clean_01_CoC_crosswalk",
+          inputs=[*COC_VINTAGES.values(), COUNTY_SHP],
+          outputs=[CROSSWALK, CROSSWALK_YEARS, COC_WEIGHTS]),
+    Stage("county_controls", "County-Level Data", "clean_02_county_controls",
+          inputs=[UNEMP, COUNTY_POP_2020s, COUNTY_POP_2010s, COVID, CROSSWALK, CROSSWALK_YEARS],
+          outputs=[COUNTY_CLEAN, COVARIATES, COC_POP_WEIGHTS]),
+    Stage("state_controls", "State-Level Data", "clean_02_state_controls",
+          inputs=[UNEMP, STATE_POP_10, STATE_POP_20, COVID],
+          outputs=[STATE_CLEAN]),
+    Stage("policy_panel", "State Policy Panel", "clean_03_policy_panel",
+          inputs=[STATE_POLICY, SCORECARD],
+          outputs=[POLICY_PANEL, POLICY_PANEL_QUARTERLY, POLICY_PANEL_MONTHLY,
+                   POLICY_CUBE, POLICY_CUBE.with_suffix(".json")]),
+    Stage("hud", "HUD CoC-Year Table", "hud",
+          inputs=[HUD_DATA],
+          outputs=[HUD_COC_YEAR, HUD_CLEAN, HUD_COC_YEAR.with_suffix(".key")]),
+    Stage("hud_merge", "HUD Data and Merging", "clean_04_HUD_data",
+          inputs=[HUD_COC_YEAR, COVARIATES, POLICY_PANEL],
+          outputs=[ALL_DATA, parquet_dir(ALL_DATA)]),
+    Stage("hud_state", "HUD State Data and Merging", "clean_04_HUD_state",
+          inputs=[HUD_COC_YEAR, STATE_CLEAN, POLICY_PANEL],
+          outputs=[ALL_STATE_DATA, parquet_dir(ALL_STATE_DATA)]),
+]
+STAGE_NAMES = [s.name for s in STAGES]
+
+
+# ------------------------------------------------------------
+# Graph
+# ------------------------------------------------------------
+
+def get_stage(name: str) -> Stage:
+    for stage in STAGES:
+        if stage.name == name:
+            return stage
+    raise KeyError(f"Unknown stage {name!r}; stages are {', '.join(STAGE_NAMES)}")
+
+
+def dependencies(stage: Stage) -> List[str]:
+    """Stages writing any of `stage`'s inputs."""
+    inputs = set(stage.inputs)
+    return [s.name for s in STAGES if s.name != stage.name and inputs & set(s.outputs)]
+
+
+def downstream(name: str) -> List[str]:
+    """`name` and every stage that depends on it, directly or not, in run order."""
+    found = {name}
+    for stage in STAGES:
+        if found & set(dependencies(stage)):
+            found.add(stage.name)
+    return [n for n in STAGE_NAMES if n in found]
+
+
+def code_files(module: str) -> List[Path]:
+    """The stage script plus every module in this folder it imports (recursively)."""
+    seen: Dict[str, Path] = {}
+    todo = [module]
+    while todo:
+        name = todo.pop()
+        path = CODE / f"{name}.py"
+        if name in seen or not path.exists():
+            continue
+        seen[name] = path
+        for node in ast.walk(ast.parse(path.read_text())):
+            if isinstance(node, ast.Import):
+                todo += [a.name.split(".")[0] for a in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                todo.append(node.module.split(".")[0])
+    return sorted(seen.values())
+
+
+# ------------------------------------------------------------
+# Hashes
+# ------------------------------------------------------------
+
+def _label(path: Path) -> str:
+    path = Path(path)
+    try:
+        return path.relative_to(PROJECT_ROOT).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+def _stat_signature(path: Path) -> str:
+    h = hashlib.sha256()
+    for f in source_files(path):
+        st = f.stat()
+        h.update(f"{f.name}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()
+
+
+def missing_outputs(stage: Stage) -> List[str]:
+    return [_label(p) for p in stage.outputs if not Path(p).exists()]
+
+
+class StageState:
+    """Recorded digests (STAGE_STATE), with a size/mtime memo for file digests."""
+
+    def __init__(self, path: Path = STAGE_STATE):
+        self.path = Path(path)
+        state = json.loads(self.path.read_text()) if self.path.exists() else {}
+        self.files: Dict[str, dict] = state.get("files", {})
+        self.stages: Dict[str, dict] = state.get("stages", {})
+
+    def digest(self, path: Path) -> Optional[str]:
+        """Content digest of a file or directory, or None if it does not exist."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        label = _label(path)
+        signature = _stat_signature(path)
+        memo = self.files.get(label)
+        if memo is None or memo["stat"] != signature:
+            memo = {"stat": signature, "sha256": file_digest(path)}
+            self.files[label] = memo
+        return memo["sha256"]
+
+    def digests(self, paths: Sequence[Path]) -> Dict[str, Optional[str]]:
+        return {_label(p): self.digest(p) for p in paths}
+
+    def stage_inputs(self, stage: Stage) -> Dict[str, Optional[str]]:
+        return self.digests(list(stage.inputs) + code_files(stage.module))
+
+    def stale_reason(self, stage: Stage, inputs: Dict[str, Optional[str]]) -> Optional[str]:
+        """Why `stage` has to run given its current `inputs` digests, or None if it is up to date."""
+        record = self.stages.get(stage.name)
+        if record is None:
+            return "no previous run"
+        changed = [p for p, d in inputs.items() if record["inputs"].get(p) != d]
+        if changed or set(record["inputs"]) != set(inputs):
+            return "inputs changed: " + ", ".join(changed or sorted(set(record["inputs"]) - set(inputs)))
+        outputs = self.digests(stage.outputs)
+        missing = [p for p, d in outputs.items() if d is None]
+        if missing:
+            return "outputs missing: " + ", ".join(missing)
+        changed = [p for p, d in outputs.items() if record["outputs"].get(p) != d]
+        if changed:
+            return "outputs modified: " + ", ".join(changed)
+        return None
+
+    def record(self, stage: Stage, inputs: Dict[str, Optional[str]]) -> None:
+        """Store a successful run; `inputs` are the digests taken before it started."""
+        missing = missing_outputs(stage)
+        if missing:
+            raise FileNotFoundError(f"{stage.name} did not write {', '.join(missing)}")
+        self.stages[stage.name] = {
+            "inputs": inputs,
+            "outputs": self.digests(stage.outputs),
+            "finished": datetime.now().isoformat(timespec="seconds"),
+        }
+        self.save()
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"files": self.files, "stages": self.stages}, indent=2, sort_keys=True))
+        tmp.replace(self.path)
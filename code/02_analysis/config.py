@@ -1,10 +1,15 @@
+import os
 from pathlib import Path
 
+import pandas as pd
+import pyarrow.parquet as pq
+
 # ============================================
 # BASE PATHS
 # ============================================
 PROJECT_ROOT = Path(__file__).parent.parent.parent
-DATA_DIR = PROJECT_ROOT / "data"
+# DMP_DATA_DIR points the analysis at another data tree, as in 01_cleaning/config.py
+DATA_DIR = Path(os.environ.get("DMP_DATA_DIR", PROJECT_ROOT / "data"))
 CODE_DIR = PROJECT_ROOT / "code"
 
 # ============================================
@@ -41,3 +46,33 @@ ALL_STATE_DATA = CLEAN_DIR / "all_state_data.dta"
 # ============================================
 TABLES = PROJECT_ROOT / "output" / "tables" / "tex"
 GRAPHS = PROJECT_ROOT / "output" / "graphs"
+FIT_CACHE_DIR = PROJECT_ROOT / "output" / "cache" / "fits"
+
+
+# ============================================
+# PANEL LOADER
+# ============================================
+def load_panel(path, columns=None, years=None):
+    """
+    Load a final panel (ALL_DATA / ALL_STATE_DATA) from its year-partitioned
+    Parquet copy (all_data/, all_state_data/), reading only `columns` and the
+    partitions for `years`. Falls back to the .dta file if the Parquet copy
+    has not been built.
+    """
+    parquet = Path(path).with_suffix("")
+    years = None if years is None else [int(y) for y in years]
+
+    if not parquet.exists():
+        df = pd.read_stata(path, columns=columns)
+        return df if years is None else df[df["year"].isin(years)].reset_index(drop=True)
+
+    read_cols = None if columns is None else list(dict.fromkeys(list(columns) + ["year"]))
+    filters = None if years is None else [("year", "in", years)]
+    table = pq.read_table(parquet, columns=read_cols, filters=filters, memory_map=True)
+
+    df = table.to_pandas()
+    # The partition key comes back as a categorical
+    df["year"] = df["year"].astype(int)
+    if columns is not None:
+        df = df[list(columns)]
+    return df
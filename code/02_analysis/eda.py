@@ -1,11 +1,12 @@
-from config import ALL_STATE_DATA, GRAPHS, TABLES
+from config import ALL_STATE_DATA, GRAPHS, TABLES, load_panel
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns   
 
 def plot_homelessness_flows():
     # Load the data
-    df = pd.read_stata(ALL_STATE_DATA)
+    df = load_panel(ALL_STATE_DATA, columns=["year", "state_code", "inflow", "exits", "POP",
+                                             "avg_days_homeless", "median_days_homeless"])
 
     # Create rate vars
     df['inflow_rate'] = df['inflow'] / df['POP'] * 100000
@@ -149,7 +150,13 @@ def make_summary_table(df: pd.DataFrame, varlist: list[str], filename: str):
 
 def main():
     print("Loading data...")
-    df = pd.read_stata(ALL_STATE_DATA)
+    # inflow/exits/POP feed the rate variables built in make_summary_table
+    raw_vars = ["inflow", "exits", "POP", "avg_days_homeless"]
+    df = load_panel(
+        ALL_STATE_DATA,
+        columns=list(dict.fromkeys(["year", "ever_treated"] + raw_vars + covariates)),
+        years=range(2016, 2024),
+    )
 
     if "year" not in df.columns:
         raise KeyError("Expected a 'year' column in ALL_DATA.")
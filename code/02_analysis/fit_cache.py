@@ -0,0 +1,100 @@
+"""
+Title: fit_cache.py
+On-disk cache of fitted regression specs under output/cache/fits.
+
+Each fitted spec is one JSON file (coefficients, SEs, p-values, covariance,
+nobs, within R-squared, covariance type) named by a key that hashes:
+
+  * the full spec (outcome, regressors, sample columns, effects, cluster, ...),
+  * the values of every panel column the spec uses, and the panel index,
+  * the backend, plus fe.py's source for the native engine or the
+    linearmodels version.
+
+Relabelling a table or adding a policy therefore refits nothing that was
+already fitted, while a change in the data or the estimator gives new keys
+and stale entries are never read back. runner.run_specs stores each result
+as soon as its unit finishes (written to a temp file, then renamed), so an
+interrupted run resumes from the specs it had not reached.
+
+Set DMP_FIT_CACHE=0 to always refit; delete output/cache/fits to clear it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from config import FIT_CACHE_DIR
+from fe import FEResult, Spec, get_backend
+
+FIT_CACHE = os.environ.get("DMP_FIT_CACHE", "1") != "0"
+# Bump when the layout of cache entries changes
+FIT_CACHE_VERSION = 1
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def estimator_digest(backend: str) -> str:
+    if backend == "linearmodels":
+        import linearmodels
+        return f"linearmodels-{linearmodels.__version__}"
+    return _sha(Path(__file__).with_name("fe.py").read_bytes())
+
+
+def column_digests(df: pd.DataFrame, columns: Sequence[str]) -> Dict[str, str]:
+    """Digest of each column's values (as float64, so storage dtype does not matter)."""
+    return {
+        c: _sha(pd.util.hash_pandas_object(df[c].astype("float64"), index=False).to_numpy().tobytes())
+        for c in columns
+    }
+
+
+def spec_keys(df: pd.DataFrame, specs: Sequence[Spec], backend: Optional[str] = None) -> List[str]:
+    backend = get_backend(backend)
+    columns = list(dict.fromkeys(c for s in specs for c in s.columns))
+    digests = column_digests(df, columns)
+    index = _sha(pd.util.hash_pandas_object(df.index).to_numpy().tobytes())
+    estimator = estimator_digest(backend)
+
+    keys = []
+    for spec in specs:
+        payload = {
+            "version": FIT_CACHE_VERSION,
+            "spec": spec._asdict(),
+            "data": [digests[c] for c in spec.columns],
+            "index": index,
+            "backend": backend,
+            "estimator": estimator,
+        }
+        keys.append(_sha(json.dumps(payload, sort_keys=True).encode())[:24])
+    return keys
+
+
+def entry_path(key: str) -> Path:
+    return FIT_CACHE_DIR / f"{key}.json"
+
+
+def load(key: str) -> Optional[FEResult]:
+    path = entry_path(key)
+    if not path.exists():
+        return None
+    try:
+        return FEResult.from_dict(json.loads(path.read_text())["result"])
+    except (ValueError, KeyError):
+        # Unreadable entry: treat as missing, it is rewritten on the next fit
+        return None
+
+
+def store(key: str, spec: Spec, result: FEResult) -> None:
+    FIT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = entry_path(key)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps({"spec": spec._asdict(), "result": result.to_dict()}))
+    os.replace(tmp, path)
@@ -1,6 +1,7 @@
-from config import ALL_DATA, TABLES
+from config import ALL_DATA, TABLES, load_panel
 import pandas as pd
-from linearmodels.panel import PanelOLS
+from fe import Spec
+from runner import run_specs
 
 
 def star_format(p):
@@ -72,25 +73,13 @@ def run_models(df):
 
     df["moratorium_index"] = df[std_vars].mean(axis=1)
 
-    for y in outcomes:
-
-        vars_needed = [y, "moratorium_index", "POP", "UNEMP", "COVID_cases"]
-        df_clean = df[vars_needed].dropna()
+    # Same sample as before: rows with COVID_cases too, although it is not a regressor here
+    specs = [Spec(y, "moratorium_index", ("POP", "UNEMP"), sample=("COVID_cases",)) for y in outcomes]
+    fits = dict(zip(outcomes, run_specs(df, specs)))
 
-        Y = df_clean[y]
-        X = df_clean[["moratorium_index", "POP", "UNEMP"]]
-
-        model = PanelOLS(
-            Y,
-            X,
-            entity_effects=True,
-            time_effects=True
-        )
+    for y in outcomes:
 
-        res = model.fit(
-            cov_type="clustered",
-            cluster_entity=True
-        )
+        res = fits[y]
 
         col_entries = []
 
@@ -128,5 +117,5 @@ def run_models(df):
     print(f"✓ Finished moratorium_index analysis")
 
 if __name__ == "__main__":
-    df = pd.read_stata(ALL_DATA)
+    df = load_panel(ALL_DATA, columns=["coc_code", "year"] + outcomes + policy_vars + controls_with_covid)
     run_models(df)
\ No newline at end of file
@@ -1,6 +1,7 @@
-from config import ALL_STATE_DATA, TABLES
+from config import ALL_STATE_DATA, TABLES, load_panel
 import pandas as pd
-from linearmodels.panel import PanelOLS
+from fe import Spec
+from runner import run_specs
 
 
 def star_format(p):
@@ -70,30 +71,17 @@ def run_models(df):
     df['weighted_scorecard'] = df['SCORECARD']
     df.loc[df['overall_days'] == 0, 'weighted_scorecard'] = 0
 
+    # Two-way FE, entity-clustered SEs; every policy x outcome model fitted as one grid
+    specs = [Spec(y, policy, tuple(controls), drop_absorbed=True) for policy in policy_vars for y in outcomes]
+    fits = dict(zip([(s.treatment, s.outcome) for s in specs], run_specs(df, specs)))
+
     for policy in policy_vars:
         results = {}
         within_r2 = {}
         obs = {}
 
         for y in outcomes:
-            vars_needed = [y, policy] + controls
-            df_clean = df[vars_needed].dropna()
-
-            Y = df_clean[y]
-            X = df_clean[[policy] + controls]
-
-            model = PanelOLS(
-                Y,
-                X,
-                entity_effects=True,
-                time_effects=True,
-                drop_absorbed=True
-            )
-
-            res = model.fit(
-                cov_type="clustered",
-                cluster_entity=True
-            )
+            res = fits[(policy, y)]
 
             col_entries = []
 
@@ -137,5 +125,8 @@ def run_models(df):
 
 
 if __name__ == "__main__":
-    df = pd.read_stata(ALL_STATE_DATA)
+    # Raw columns behind the outcomes, policy variables and controls built in run_models
+    raw_vars = ["inflow", "exits", "exits_perm", "POP", "SCORECARD", "avg_days_homeless", "median_days_homeless"]
+    days_vars = [v for v in policy_vars if v.endswith("_days")]
+    df = load_panel(ALL_STATE_DATA, columns=list(dict.fromkeys(["state_code", "year"] + raw_vars + days_vars + controls)))
     run_models(df)
\ No newline at end of file
@@ -0,0 +1,87 @@
+'''
+Title: master_analysis.py
+Updated: 2026-02
+
+Runs the analysis scripts on the cleaned panels, in SCRIPTS order.
+
+Each script runs under code/perf.py in a fresh interpreter (python <script>
+as __main__ from this folder), with its output going to the console. A failed
+script is reported and the rest still run, since each reads only the cleaned
+data.
+
+    python master_analysis.py                          # every script
+    python master_analysis.py --only main_analysis     # one script (repeatable)
+    python master_analysis.py --profile sep_analysis   # cProfile one script (see code/perf.py)
+
+The run report (time, CPU, memory, I/O and merge row counts per script) is
+written to output/perf/run-<run id>.json.
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from config import CODE_DIR
+
+sys.path.append(str(CODE_DIR))
+import perf
+
+ANALYSIS = Path(__file__).parent
+SCRIPTS = ["summary_statistics", "eda", "main_analysis", "sep_analysis", "index_analysis"]
+
+
+def run_script(name, run_id):
+    """Run one analysis script under perf.py in a fresh interpreter; returns (exit code, seconds)."""
+    cmd = [sys.executable, "-u", perf.__file__, "--run-id", run_id, "--no-report", str(ANALYSIS / f"{name}.py")]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ANALYSIS)
+    return proc.returncode, time.perf_counter() - t0
+
+
+def main(only=None, profile=None):
+    run_id = os.environ.get(perf.RUN_ID_ENV) or perf.new_run_id()
+    if profile:
+        os.environ[perf.PROFILE_ENV] = profile
+    status = {}
+    failed = []
+    t_start = time.perf_counter()
+
+    for name in [s for s in SCRIPTS if not only or s in only]:
+        print(f"\n[RUN] {name}")
+        code, seconds = run_script(name, run_id)
+        if code == 0:
+            status[name] = {"status": "ok"}
+            print(f"[DONE] {name} in {seconds:.1f}s")
+        else:
+            status[name] = {"status": "failed", "reason": f"exit code {code}"}
+            failed.append(name)
+            print(f"[FAIL] {name} exited with {code} after {seconds:.1f}s")
+
+    if perf.run_dir(run_id).exists():
+        report = perf.write_report(run_id, {"scripts": status})
+        perf.print_summary(json.loads(report.read_text())["records"])
+        print(f"\nRun report: {report}")
+
+    if failed:
+        print(f"\n[FAILED] {', '.join(failed)}")
+        return 1
+    print(f"\n[ALL DONE] All analysis scripts complete in {time.perf_counter() - t_start:.1f}s!")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the analysis scripts.")
+    parser.add_argument("--only", action="append", choices=SCRIPTS, metavar="SCRIPT",
+                        help=f"run just this script (repeatable); one of {', '.join(SCRIPTS)}")
+    parser.add_argument("--profile", metavar="SCRIPT[,SCRIPT]",
+                        help="profile these scripts (cProfile; DMP_PROFILER=sample for the sampling profiler)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sys.exit(main(only=args.only, profile=args.profile))
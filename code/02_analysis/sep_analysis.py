@@ -1,6 +1,7 @@
-from config import ALL_DATA, TABLES
+from config import ALL_DATA, TABLES, load_panel
 import pandas as pd
-from linearmodels.panel import PanelOLS
+from fe import Spec
+from runner import run_specs
 
 
 def star_format(p):
@@ -64,29 +65,17 @@ def run_models(df):
     df = df.copy()
     df = df.set_index(["coc_code", "year"]).sort_index()
 
+    # Two-way FE, entity-clustered SEs; every policy x outcome model fitted as one grid
+    specs = [Spec(y, policy, ("POP", "UNEMP", "COVID_cases")) for policy in policy_vars for y in outcomes]
+    fits = dict(zip([(s.treatment, s.outcome) for s in specs], run_specs(df, specs)))
+
     for policy in policy_vars:
 
         results = {}
 
         for y in outcomes:
 
-            vars_needed = [y, policy, "POP", "UNEMP", "COVID_cases"]
-            df_clean = df[vars_needed].dropna()
-
-            Y = df_clean[y]
-            X = df_clean[[policy, "POP", "UNEMP", "COVID_cases"]]
-
-            model = PanelOLS(
-                Y,
-                X,
-                entity_effects=True,
-                time_effects=True
-            )
-
-            res = model.fit(
-                cov_type="clustered",
-                cluster_entity=True
-            )
+            res = fits[(policy, y)]
 
             col_entries = []
 
@@ -124,5 +113,5 @@ def run_models(df):
         print(f"✓ Finished {policy}")
 
 if __name__ == "__main__":
-    df = pd.read_stata(ALL_DATA)
+    df = load_panel(ALL_DATA, columns=["coc_code", "year"] + outcomes + policy_vars + controls)
     run_models(df)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from config import ALL_DATA, TABLES
+from config import ALL_DATA, TABLES, load_panel
 import pandas as pd
 
 outcomes = [
@@ -105,7 +105,11 @@ def make_summary_table(df: pd.DataFrame, varlist: list[str], filename: str):
 
 def main():
     print("Loading data...")
-    df = pd.read_stata(ALL_DATA)
+    df = load_panel(
+        ALL_DATA,
+        columns=list(dict.fromkeys(["year", "ever_treated"] + outcomes + covariates)),
+        years=range(2016, 2024),
+    )
 
     if "year" not in df.columns:
         raise KeyError("Expected a 'year' column in ALL_DATA.")
@@ -0,0 +1,159 @@
+"""
+Title: run_benchmarks.py
+Time every cleaning stage on synthetic inputs at several scale factors.
+
+    python code/benchmarks/run_benchmarks.py                       # scales 0.25 and 1
+    python code/benchmarks/run_benchmarks.py --scales 0.5,1,2,4
+    python code/benchmarks/run_benchmarks.py --save-baseline       # store this run as the baseline
+    python code/benchmarks/run_benchmarks.py --check               # exit 1 on a regression
+
+For each scale synthetic.write_raw builds a full raw-data tree in a scratch
+folder, and master_clean runs every stage on it twice through perf.py: "cold"
+(empty caches) and "warm" (caches filled, every stage forced). Stages run one
+at a time so their timings do not interfere. The per-stage perf records
+(wall, CPU, peak RSS, I/O, merge rows) are written to
+output/benchmarks/bench-<timestamp>.json.
+
+A stage regresses when its wall time exceeds the baseline's (same scale and
+run) by more than --tolerance and by at least --min-seconds. Baselines are
+machine-specific: save one on the machine you compare on.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import synthetic
+
+CODE_DIR = Path(__file__).parent.parent
+PROJECT_ROOT = CODE_DIR.parent
+BENCH_DIR = PROJECT_ROOT / "output" / "benchmarks"
+BASELINE = BENCH_DIR / "baseline.json"
+
+SCALES = [0.25, 1.0]
+RUNS = ["cold", "warm"]
+TOLERANCE = 0.25
+MIN_SECONDS = 0.5
+
+
+def run_pipeline(data_dir: Path, perf_dir: Path, run: str, jobs: int) -> Dict[str, dict]:
+    """master_clean --force on data_dir; returns the perf record of every stage that ran."""
+    env = {**os.environ, "DMP_DATA_DIR": str(data_dir), "DMP_PERF_DIR": str(perf_dir), "DMP_RUN_ID": run}
+    proc = subprocess.run([sys.executable, "master_clean.py", "--force", "--jobs", str(jobs)],
+                          cwd=CODE_DIR / "01_cleaning", env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(proc.stdout[-3000:])
+    records = {}
+    for path in sorted((perf_dir / run).glob("*.json")):
+        record = json.loads(path.read_text())
+        records[record["name"]] = {k: v for k, v in record.items() if k not in ("name", "script", "started")}
+    return records
+
+
+def bench_scale(scale: float, covid_days: int, jobs: int, keep: bool) -> dict:
+    root = Path(tempfile.mkdtemp(prefix=f"dmp-bench-{scale}-"))
+    data_dir = root / "data"
+    (data_dir / "02_cleaned").mkdir(parents=True)
+    print(f"\n[SCALE {scale}] writing synthetic inputs to {root}")
+
+    t0 = time.perf_counter()
+    sizes = synthetic.write_raw(data_dir, scale=scale, covid_days=covid_days)
+    result = {"scale": scale, "sizes": sizes, "generate_s": round(time.perf_counter() - t0, 2), "runs": {}}
+    print(f"  {sizes} in {result['generate_s']}s")
+
+    for run in RUNS:
+        t0 = time.perf_counter()
+        stages = run_pipeline(data_dir, root / "perf", run, jobs)
+        result["runs"][run] = {"total_s": round(time.perf_counter() - t0, 2), "stages": stages}
+        print(f"  {run}: {result['runs'][run]['total_s']}s")
+        for name, r in stages.items():
+            print(f"    {name:<18}{r['status']:<8}{r['wall_s']:>8.2f}s  rss {max(r['peak_rss_mb'], r['children_peak_rss_mb']):>7.0f} MB")
+
+    if not keep:
+        shutil.rmtree(root)
+    return result
+
+
+def regressions(results: List[dict], baseline: dict, tolerance: float, min_seconds: float) -> List[str]:
+    """Stages slower than the baseline's same scale and run."""
+    base = {r["scale"]: r for r in baseline["results"]}
+    found = []
+    for r in results:
+        if r["scale"] not in base:
+            continue
+        for run, data in r["runs"].items():
+            before = base[r["scale"]]["runs"].get(run, {}).get("stages", {})
+            for name, rec in data["stages"].items():
+                if name not in before:
+                    continue
+                old, new = before[name]["wall_s"], rec["wall_s"]
+                if new > old * (1 + tolerance) and new - old >= min_seconds:
+                    found.append(f"scale {r['scale']} {run} {name}: {old:.2f}s -> {new:.2f}s ({new / old - 1:+.0%})")
+    return found
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the cleaning stages on synthetic data.")
+    parser.add_argument("--scales", default=",".join(map(str, SCALES)),
+                        help="comma-separated scale factors (1 = ~3,100 counties, ~380 CoCs)")
+    parser.add_argument("--covid-days", type=int, default=synthetic.COVID_DAYS, help="NYT rows per county and year")
+    parser.add_argument("--jobs", type=int, default=1, help="stages run at once (default 1 for clean timings)")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic data folders")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--check", action="store_true", help="exit 1 if a stage regressed")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--min-seconds", type=float, default=MIN_SECONDS)
+    args = parser.parse_args(argv)
+
+    scales = [float(s) for s in args.scales.split(",")]
+    results = [bench_scale(s, args.covid_days, args.jobs, args.keep) for s in scales]
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "covid_days": args.covid_days,
+        "jobs": args.jobs,
+        "results": results,
+    }
+    BENCH_DIR.mkdir(parents=True, exist_ok=True)
+    out = BENCH_DIR / f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.write_text(json.dumps(report, indent=2))
+    print(f"\nResults: {out}")
+
+    failed = [f"scale {r['scale']} {run} {name}" for r in results for run, data in r["runs"].items()
+              for name, rec in data["stages"].items() if rec["status"] != "ok"]
+    for f in failed:
+        print(f"[FAIL] {f}")
+
+    found = []
+    if args.baseline.exists():
+        found = regressions(results, json.loads(args.baseline.read_text()), args.tolerance, args.min_seconds)
+        for f in found:
+            print(f"[REGRESSION] {f}")
+        if not found:
+            print(f"No regressions against {args.baseline}")
+    if args.save_baseline:
+        shutil.copyfile(out, args.baseline)
+        print(f"Saved baseline: {args.baseline}")
+
+    return 1 if args.check and (found or failed) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,346 @@
+"""
+Title: synthetic.py
+Synthetic raw inputs for benchmarking the cleaning pipeline.
+
+write_raw(raw_dir, scale) writes a complete data/01_raw tree under the file
+names in code/01_cleaning/config.py: the HUD SPM workbook, CoC boundaries
+(geodatabase) and TIGER-style county shapefile, county and state population
+estimates, LAUS county workbooks, NYT daily county CSVs, the moratoria
+workbook and the housing policy scorecard. Scale 1 is roughly today's real
+size (~3,100 counties, ~380 CoCs, 8 HUD years, a year of daily NYT rows);
+every generator also takes explicit counts.
+
+Geography is a grid: each state is a block of square counties, and its CoCs
+are a Voronoi split of that block, so CoCs never cross state lines and every
+CoC code carries a real state prefix (AL-500, AL-501, ...). The same seed
+always gives the same files.
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+CLEANING = Path(__file__).parent.parent / "01_cleaning"
+sys.path.insert(0, str(CLEANING))
+
+import config  # noqa: E402
+from geography import STATES, TERRITORIES  # noqa: E402
+from hud import RENAME as HUD_COLUMNS  # noqa: E402
+from clean_03_policy_panel import SHEET_NAME as POLICY_SHEET, STATE_POLICY_COLUMNS  # noqa: E402
+
+BASE_COUNTIES = 3100
+BASE_COCS = 380
+HUD_YEARS = range(2016, 2024)
+POP_YEARS_10 = range(2010, 2020)
+POP_YEARS_20 = range(2020, 2025)
+LAUS_YEARS = range(2016, 2024)
+COVID_YEARS = range(2020, 2024)
+COVID_DAYS = 365
+
+# Each state is a block of COUNTY_SIZE x COUNTY_SIZE meter counties (EPSG:5070),
+# blocks laid out STATES_PER_ROW to a row
+CRS = 5070
+COUNTY_SIZE = 20_000.0
+STATE_GAP = 50_000.0
+STATES_PER_ROW = 8
+MAX_COUNTIES_PER_STATE = 999
+
+
+def states() -> pd.DataFrame:
+    """The 50 states + DC (fips, code, name)."""
+    st = STATES[~STATES["state_fips"].isin(TERRITORIES)].reset_index(drop=True)
+    return st.rename(columns={"state_fips": "fips", "state_code": "code", "state_name": "name"})
+
+
+def split(total: int, parts: int) -> np.ndarray:
+    """`total` spread as evenly as possible over `parts` (each at least 1)."""
+    total = max(total, parts)
+    return np.full(parts, total // parts) + (np.arange(parts) < total % parts)
+
+
+def write_xlsx(path: Path, sheets: Dict[str, Iterable[Sequence]]) -> None:
+    """Workbook with one sheet per entry, rows written in streaming mode."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for name, rows in sheets.items():
+        ws = wb.create_sheet(name)
+        for row in rows:
+            ws.append(list(row))
+    wb.save(path)
+
+
+# ------------------------------------------------------------
+# Geography
+# ------------------------------------------------------------
+
+def geography(n_counties: int, n_cocs: int, seed: int = 0):
+    """(counties, cocs) GeoDataFrames; counties carry county_fips and state, CoCs COCNUM."""
+    import geopandas as gpd
+    import shapely
+
+    rng = np.random.default_rng(seed)
+    st = states()
+    per_state = np.minimum(split(n_counties, len(st)), MAX_COUNTIES_PER_STATE)
+    cocs_per_state = np.minimum(split(n_cocs, len(st)), per_state)
+
+    # Block pitch from the largest state
+    pitch = np.ceil(np.sqrt(per_state.max())) * COUNTY_SIZE + STATE_GAP
+
+    county_rows, coc_rows = [], []
+    for s, ((fips, code, name), k, m) in enumerate(
+            zip(st[["fips", "code", "name"]].itertuples(index=False), per_state, cocs_per_state)):
+        x0, y0 = (s % STATES_PER_ROW) * pitch, (s // STATES_PER_ROW) * pitch
+        cols = int(np.ceil(np.sqrt(k)))
+        rows = int(np.ceil(k / cols))
+        i = np.arange(k)
+        xs = x0 + (i % cols) * COUNTY_SIZE
+        ys = y0 + (i // cols) * COUNTY_SIZE
+        boxes = shapely.box(xs, ys, xs + COUNTY_SIZE, ys + COUNTY_SIZE)
+        county_rows.append(pd.DataFrame({
+            "STATEFP": f"{fips:02d}",
+            "COUNTYFP": [f"{c:03d}" for c in i + 1],
+            "NAME": [f"County {c}" for c in i + 1],
+            "GEOID": [f"{fips:02d}{c:03d}" for c in i + 1],
+            "geometry": boxes,
+        }))
+
+        # CoCs: Voronoi cells of random points, clipped to the state's counties
+        state_shape = shapely.union_all(boxes)
+        pts = rng.uniform([x0, y0], [x0 + cols * COUNTY_SIZE, y0 + rows * COUNTY_SIZE], (m, 2))
+        cells = shapely.voronoi_polygons(shapely.multipoints(pts), extend_to=state_shape)
+        cells = [shapely.intersection(c, state_shape) for c in shapely.get_parts(cells)]
+        cells = [c for c in cells if not c.is_empty]
+        coc_rows.append(pd.DataFrame({
+            "STATE_NAME": name,
+            "COCNUM": [f"{code}-{500 + j}" for j in range(len(cells))],
+            "COCNAME": [f"{name} CoC {500 + j}" for j in range(len(cells))],
+            "geometry": [shapely.MultiPolygon([c]) if c.geom_type == "Polygon" else c for c in cells],
+        }))
+
+    counties = gpd.GeoDataFrame(pd.concat(county_rows, ignore_index=True), crs=CRS)
+    cocs = gpd.GeoDataFrame(pd.concat(coc_rows, ignore_index=True), crs=CRS)
+    return counties, cocs
+
+
+def write_geography(counties, cocs, county_shp: Path, coc_gdb: Path) -> None:
+    county_shp.parent.mkdir(parents=True, exist_ok=True)
+    counties.to_file(county_shp)
+    cocs.to_file(coc_gdb, driver="OpenFileGDB", layer="CoC_Boundaries")
+
+
+# ------------------------------------------------------------
+# HUD SPM workbook
+# ------------------------------------------------------------
+
+def write_hud(path: Path, coc_codes: Sequence[str], years: Iterable[int] = HUD_YEARS, seed: int = 1) -> None:
+    """Cover sheet, then one sheet per year: title row, header row, one row per CoC."""
+    rng = np.random.default_rng(seed)
+    header = list(HUD_COLUMNS)
+    n = len(coc_codes)
+
+    def year_rows(year):
+        yield [f"FY{year} System Performance Measures"]
+        yield header
+        exits = rng.integers(10, 5000, n)
+        cols = [
+            [f"{c} Continuum of Care" for c in coc_codes],
+            list(coc_codes),
+            rng.integers(10, 5000, n),
+            rng.uniform(20, 300, n).round(1),
+            rng.integers(10, 200, n),
+            rng.uniform(0.2, 1.0, n).round(3),
+            exits,
+            (exits * rng.uniform(0.2, 0.9, n)).astype(int),
+            rng.integers(0, 2000, n),
+            rng.uniform(0.3, 1.0, n).round(3),
+        ]
+        for values in zip(*cols):
+            row = [v.item() if hasattr(v, "item") else v for v in values]
+            # HUD marks suppressed cells as text
+            if rng.random() < 0.02:
+                row[-1] = "N/A"
+            yield row
+
+    sheets = {"Notes": [["Synthetic HUD SPM workbook"]]}
+    sheets.update({str(y): year_rows(y) for y in years})
+    write_xlsx(path, sheets)
+
+
+# ------------------------------------------------------------
+# Population, unemployment, COVID
+# ------------------------------------------------------------
+
+def write_county_pop(path: Path, counties: pd.DataFrame, years: Iterable[int], seed: int = 2) -> None:
+    """Census co-est file: a SUMLEV 40 state row before each state's SUMLEV 50 county rows."""
+    rng = np.random.default_rng(seed)
+    years = list(years)
+    base = pd.DataFrame({
+        "SUMLEV": 50,
+        "STATE": counties["STATEFP"].astype(int).to_numpy(),
+        "COUNTY": counties["COUNTYFP"].astype(int).to_numpy(),
+        "STNAME": "State",
+        "CTYNAME": counties["NAME"].to_numpy(),
+    })
+    level = rng.integers(1_000, 2_000_000, len(base))
+    for j, y in enumerate(years):
+        base[f"POPESTIMATE{y}"] = (level * (1 + 0.005 * j)).astype(int)
+
+    totals = base.groupby("STATE", as_index=False)[[f"POPESTIMATE{y}" for y in years]].sum()
+    totals = totals.assign(SUMLEV=40, COUNTY=0, STNAME="State", CTYNAME="State")
+    df = pd.concat([totals, base], ignore_index=True).sort_values(["STATE", "COUNTY"], kind="stable")
+    df[base.columns].to_csv(path, index=False, encoding="latin-1")
+
+
+def write_state_pop(path: Path, sheet: str, years: Iterable[int], seed: int = 3) -> None:
+    """Census NST-EST workbook: three title rows, a year header, '.State' rows."""
+    rng = np.random.default_rng(seed)
+    years = list(years)
+    rows = [[sheet], ["Annual Estimates of the Resident Population"], ["(synthetic)"]]
+    rows.append([None, "Base"] + years)
+    rows.append(["United States", None] + [None] * len(years))
+    for name in states()["name"]:
+        level = int(rng.integers(500_000, 40_000_000))
+        rows.append([f".{name}", level] + [int(level * (1 + 0.004 * j)) for j in range(len(years))])
+    rows.append(["Source: synthetic"])
+    write_xlsx(path, {sheet: rows})
+
+
+def write_laus(unemp_dir: Path, counties: pd.DataFrame, years: Iterable[int] = LAUS_YEARS, seed: int = 4) -> None:
+    """One laucntyYY.xlsx per year: title row, header, county rows, footnotes."""
+    rng = np.random.default_rng(seed)
+    unemp_dir.mkdir(parents=True, exist_ok=True)
+    statefips = counties["STATEFP"].astype(int).to_numpy()
+    countyfips = counties["COUNTYFP"].astype(int).to_numpy()
+    header = ["LAUS Code", "State FIPS Code", "County FIPS Code", "County Name/State Abbreviation", "Year",
+              "Labor Force", "Employed", "Unemployed", "Unemployment Rate (%)"]
+    for year in years:
+        lf = rng.integers(500, 5_000_000, len(counties))
+        un = (lf * rng.uniform(0.02, 0.12, len(counties))).astype(int)
+        rate = (un / lf * 100).round(1)
+
+        def rows():
+            yield ["Labor force data by county, annual averages"]
+            yield header
+            for s, c, f, u, r in zip(statefips, countyfips, lf, un, rate):
+                yield [f"CN{s:02d}{c:03d}00000000", int(s), int(c), "County", year,
+                       int(f), int(f - u), int(u), "N.A." if rng.random() < 0.005 else float(r)]
+            yield ["p = preliminary."]
+            yield ["SOURCE: synthetic"]
+
+        name = f"laucnty{str(year)[-2:]}"
+        write_xlsx(unemp_dir / f"{name}.xlsx", {name: rows()})
+
+
+def write_covid(covid_dir: Path, counties: pd.DataFrame, years: Iterable[int] = COVID_YEARS,
+                days: int = COVID_DAYS, seed: int = 5) -> None:
+    """NYT us-counties-YYYY.csv: one row per county and day with cumulative counts."""
+    rng = np.random.default_rng(seed)
+    covid_dir.mkdir(parents=True, exist_ok=True)
+    fips = counties["GEOID"].astype(int).to_numpy()
+    n = len(fips)
+    cases = np.zeros(n, dtype=np.int64)
+    deaths = np.zeros(n, dtype=np.int64)
+    for year in years:
+        dates = pd.date_range(f"{year}-01-01", periods=days, freq="D")
+        new_cases = rng.poisson(5, (days, n))
+        new_deaths = rng.binomial(new_cases, 0.01)
+        cum_cases = cases + np.cumsum(new_cases, axis=0)
+        cum_deaths = deaths + np.cumsum(new_deaths, axis=0)
+        cases, deaths = cum_cases[-1], cum_deaths[-1]
+
+        df = pd.DataFrame({
+            "date": np.repeat(dates.strftime("%Y-%m-%d"), n),
+            "county": "County",
+            "state": "State",
+            "fips": np.tile(fips, days).astype(float),
+            "cases": cum_cases.ravel(),
+            "deaths": cum_deaths.ravel().astype(float),
+        })
+        # NYT's "Unknown" county rows have no FIPS
+        unknown = df.iloc[::max(n, 1)].assign(county="Unknown", fips=np.nan)
+        pd.concat([df, unknown], ignore_index=True).to_csv(covid_dir / f"us-counties-{year}.csv", index=False)
+
+
+# ------------------------------------------------------------
+# Policy sources
+# ------------------------------------------------------------
+
+def write_moratoria(path: Path, seed: int = 6) -> None:
+    """Moratoria workbook: one row per state (plus PR), MM/DD/YYYY windows per policy."""
+    rng = np.random.default_rng(seed)
+    names = list(states()["name"]) + ["Puerto Rico"]
+    date_cols = [c for pair in STATE_POLICY_COLUMNS.values() for c in pair]
+    header = ["State"] + date_cols
+
+    def window():
+        if rng.random() < 0.3:
+            return None, None
+        start = pd.Timestamp("2020-03-01") + pd.Timedelta(days=int(rng.integers(0, 400)))
+        if rng.random() < 0.1:
+            return start.strftime("%m/%d/%Y"), None
+        end = start + pd.Timedelta(days=int(rng.integers(10, 500)))
+        return start.strftime("%m/%d/%Y"), end.strftime("%m/%d/%y")
+
+    def rows():
+        yield header
+        for k, name in enumerate(names):
+            cells = []
+            for _ in STATE_POLICY_COLUMNS:
+                cells += window()
+            # Some states carry a footnote number after the name
+            yield [f"{name} {k % 4}" if k % 7 == 0 else name] + cells
+
+    write_xlsx(path, {POLICY_SHEET: rows()})
+
+
+def write_scorecard(path: Path, seed: int = 7) -> None:
+    rng = np.random.default_rng(seed)
+    rows = [["state", "SCORECARD", "RENT_POP"]]
+    for name in states()["name"]:
+        rows.append([name, int(rng.integers(0, 20)), int(rng.integers(50_000, 5_000_000))])
+    write_xlsx(path, {"Scorecard": rows})
+
+
+# ------------------------------------------------------------
+# Everything
+# ------------------------------------------------------------
+
+def sizes(scale: float) -> Dict[str, int]:
+    return {
+        "counties": int(round(BASE_COUNTIES * scale)),
+        "cocs": int(round(BASE_COCS * scale)),
+    }
+
+
+def raw_path(data_dir: Path, path: Path) -> Path:
+    """A config.RAW_DIR path moved under another data tree."""
+    return data_dir / config.RAW_DIR.relative_to(config.DATA_DIR) / path.relative_to(config.RAW_DIR)
+
+
+def write_raw(data_dir: Path, scale: float = 1.0, covid_days: int = COVID_DAYS, seed: int = 0) -> Dict[str, int]:
+    """Write every raw input the cleaning stages read under data_dir/01_raw; returns the sizes used."""
+    n = sizes(scale)
+    counties, cocs = geography(n["counties"], n["cocs"], seed=seed)
+    vintage_gdbs = [raw_path(data_dir, p) for p in config.COC_VINTAGES.values()]
+
+    raw_path(data_dir, config.COUNTY_POP_2020s).parent.mkdir(parents=True, exist_ok=True)
+    write_geography(counties, cocs, raw_path(data_dir, config.COUNTY_SHP), vintage_gdbs[0])
+    for gdb in vintage_gdbs[1:]:
+        cocs.to_file(gdb, driver="OpenFileGDB", layer="CoC_Boundaries")
+
+    write_hud(raw_path(data_dir, config.HUD_DATA), list(cocs["COCNUM"]), seed=seed + 1)
+    write_county_pop(raw_path(data_dir, config.COUNTY_POP_2010s), counties, POP_YEARS_10, seed=seed + 2)
+    write_county_pop(raw_path(data_dir, config.COUNTY_POP_2020s), counties, POP_YEARS_20, seed=seed + 3)
+    write_state_pop(raw_path(data_dir, config.STATE_POP_10), "NST-EST2020INT-POP", POP_YEARS_10, seed=seed + 4)
+    write_state_pop(raw_path(data_dir, config.STATE_POP_20), "NST-EST2024-POP", POP_YEARS_20, seed=seed + 5)
+    write_laus(raw_path(data_dir, config.UNEMP), counties, seed=seed + 6)
+    write_covid(raw_path(data_dir, config.COVID), counties, days=covid_days, seed=seed + 7)
+    write_moratoria(raw_path(data_dir, config.STATE_POLICY), seed=seed + 8)
+    write_scorecard(raw_path(data_dir, config.SCORECARD), seed=seed + 9)
+    return {"counties": len(counties), "cocs": len(cocs), "hud_years": len(HUD_YEARS), "covid_days": covid_days}
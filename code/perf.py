@@ -0,0 +1,325 @@
+"""
+Title: perf.py
+Run a cleaning stage or analysis script under instrumentation and write a
+JSON performance record.
+
+    python code/perf.py code/02_analysis/sep_analysis.py
+    python code/perf.py code/02_analysis/*.py
+    python code/perf.py --profile sep_analysis code/02_analysis/sep_analysis.py
+    python code/02_analysis/master_analysis.py
+    DMP_PROFILE=hud_merge python code/01_cleaning/master_clean.py
+
+Each script runs as __main__ from its own folder (so `from config import ...`
+resolves as usual) and the record holds wall and CPU time (own process and
+reaped worker processes), peak RSS, bytes read/written, and the rows going
+into and out of every pandas merge, with the line that called it (plus the
+largest frame sizes schema.py measured, for cleaning stages). Records go
+to output/perf/<run id>/<name>.json and the run report, one JSON file with
+every record of the run, to output/perf/run-<run id>.json (DMP_PERF_DIR
+overrides output/perf). master_clean runs
+every stage through this wrapper and writes the report for the whole
+pipeline.
+
+Profiling is opt-in per script name (file stem, or stage name under
+master_clean): --profile NAME or DMP_PROFILE=NAME[,NAME...]. The default
+profiler is cProfile (<name>.prof, readable with pstats/snakeviz, plus a
+<name>.prof.txt summary); --profiler sample or DMP_PROFILER=sample uses a
+sampling profiler instead and writes collapsed stacks (<name>.folded) that
+flamegraph.pl or speedscope read directly.
+"""
+
+from __future__ import annotations
+
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import runpy
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).parent.parent
+PERF_DIR = Path(os.environ.get("DMP_PERF_DIR", PROJECT_ROOT / "output" / "perf"))
+
+# Environment passed from master_clean (and to child runs of this script)
+RUN_ID_ENV = "DMP_RUN_ID"
+PROFILE_ENV = "DMP_PROFILE"
+PROFILER_ENV = "DMP_PROFILER"
+
+SAMPLE_INTERVAL = 0.005
+PROFILE_TOP = 40
+
+
+def new_run_id() -> str:
+    return datetime.now().strftime("%Y%m%d-%H%M%S")
+
+
+def run_dir(run_id: str) -> Path:
+    return PERF_DIR / run_id
+
+
+def profiled_names(profile: Optional[str] = None) -> List[str]:
+    names = profile if profile is not None else os.environ.get(PROFILE_ENV, "")
+    return [n.strip() for n in names.split(",") if n.strip()]
+
+
+# ------------------------------------------------------------
+# Resource counters
+# ------------------------------------------------------------
+
+def _proc_io() -> Dict[str, int]:
+    """Bytes read/written by this process (Linux /proc; empty elsewhere)."""
+    try:
+        lines = Path("/proc/self/io").read_text().splitlines()
+    except OSError:
+        return {}
+    return {k: int(v) for k, v in (line.split(": ") for line in lines)}
+
+
+def _usage() -> Dict[str, float]:
+    import resource
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "cpu_user": own.ru_utime,
+        "cpu_sys": own.ru_stime,
+        "children_cpu_user": kids.ru_utime,
+        "children_cpu_sys": kids.ru_stime,
+        "peak_rss": own.ru_maxrss * rss_unit,
+        "children_peak_rss": kids.ru_maxrss * rss_unit,
+        "children_blocks_in": kids.ru_inblock,
+        "children_blocks_out": kids.ru_oublock,
+    }
+
+
+# ------------------------------------------------------------
+# Merge row counts
+# ------------------------------------------------------------
+
+def _call_site() -> str:
+    """First frame outside pandas and this file, as file:line (function)."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        fname = frame.f_code.co_filename
+        if "pandas" not in Path(fname).parts and fname != __file__:
+            return f"{Path(fname).name}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return "?"
+
+
+def track_merges(merges: List[dict]):
+    """Patch pandas' merge so every call (pd.merge, DataFrame.merge/join) is
+    logged to `merges`; returns a function that undoes the patch."""
+    import pandas as pd
+    import pandas.core.reshape.merge as merge_mod
+
+    original = merge_mod.merge
+
+    def merge(left, right, *args, **kwargs):
+        t0 = time.perf_counter()
+        out = original(left, right, *args, **kwargs)
+        merges.append({
+            "call": _call_site(),
+            "how": kwargs.get("how", "inner"),
+            "left_rows": len(left),
+            "right_rows": len(right),
+            "out_rows": len(out),
+            "seconds": round(time.perf_counter() - t0, 4),
+        })
+        return out
+
+    merge_mod.merge = merge
+    pd.merge = merge
+
+    def restore():
+        merge_mod.merge = original
+        pd.merge = original
+
+    return restore
+
+
+# ------------------------------------------------------------
+# Profilers
+# ------------------------------------------------------------
+
+class SamplingProfiler:
+    """Samples the main thread's stack every `interval` seconds from a background thread."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._target = threading.main_thread().ident
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: Path) -> None:
+        path.write_text("".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common()))
+
+
+# ------------------------------------------------------------
+# Running a script
+# ------------------------------------------------------------
+
+def instrument(script: Path, name: str, out_dir: Path, profile: bool = False,
+               profiler: str = "cprofile") -> dict:
+    """Run `script` as __main__ in this process and write <out_dir>/<name>.json."""
+    script = Path(script).resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    merges: List[dict] = []
+    restore = track_merges(merges)
+    sys.path.insert(0, str(script.parent))
+    cwd = os.getcwd()
+    os.chdir(script.parent)
+
+    prof = None
+    if profile:
+        prof = SamplingProfiler() if profiler == "sample" else cProfile.Profile()
+
+    io0, use0 = _proc_io(), _usage()
+    started = datetime.now()
+    t0 = time.perf_counter()
+    status, error = "ok", None
+    try:
+        if prof is not None:
+            prof.start() if isinstance(prof, SamplingProfiler) else prof.enable()
+        runpy.run_path(str(script), run_name="__main__")
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            status, error = "failed", f"SystemExit({e.code!r})"
+            if not isinstance(e.code, int):
+                print(e.code, file=sys.stderr)
+    except BaseException:
+        status, error = "failed", traceback.format_exc()
+        traceback.print_exc()
+    finally:
+        if prof is not None:
+            prof.stop() if isinstance(prof, SamplingProfiler) else prof.disable()
+        wall = time.perf_counter() - t0
+        io1, use1 = _proc_io(), _usage()
+        os.chdir(cwd)
+        sys.path.remove(str(script.parent))
+        restore()
+
+    record = {
+        "name": name,
+        "script": str(script.relative_to(PROJECT_ROOT)) if PROJECT_ROOT in script.parents else str(script),
+        "status": status,
+        "started": started.isoformat(timespec="seconds"),
+        "wall_s": round(wall, 3),
+        "cpu_s": round(use1["cpu_user"] + use1["cpu_sys"] - use0["cpu_user"] - use0["cpu_sys"], 3),
+        "children_cpu_s": round(use1["children_cpu_user"] + use1["children_cpu_sys"]
+                                - use0["children_cpu_user"] - use0["children_cpu_sys"], 3),
+        "peak_rss_mb": round(use1["peak_rss"] / 2**20, 1),
+        "children_peak_rss_mb": round(use1["children_peak_rss"] / 2**20, 1),
+        "bytes_read": io1.get("rchar", 0) - io0.get("rchar", 0) if io0 else None,
+        "bytes_written": io1.get("wchar", 0) - io0.get("wchar", 0) if io0 else None,
+        "disk_bytes_read": io1.get("read_bytes", 0) - io0.get("read_bytes", 0) if io0 else None,
+        "disk_bytes_written": io1.get("write_bytes", 0) - io0.get("write_bytes", 0) if io0 else None,
+        "children_disk_bytes_read": 512 * (use1["children_blocks_in"] - use0["children_blocks_in"]),
+        "children_disk_bytes_written": 512 * (use1["children_blocks_out"] - use0["children_blocks_out"]),
+        "merges": merges,
+        "error": error,
+    }
+    # Frame sizes measured by 01_cleaning/schema.py, when the script used it
+    schema = sys.modules.get("schema")
+    if schema is not None and getattr(schema, "FRAME_PEAKS", None):
+        record["frames_mb"] = dict(schema.FRAME_PEAKS)
+        record["peak_frame_mb"] = max(schema.FRAME_PEAKS.values())
+
+    if isinstance(prof, SamplingProfiler):
+        prof.write(out_dir / f"{name}.folded")
+        record["profile"] = str(out_dir / f"{name}.folded")
+    elif prof is not None:
+        prof.dump_stats(out_dir / f"{name}.prof")
+        text = io.StringIO()
+        pstats.Stats(prof, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        (out_dir / f"{name}.prof.txt").write_text(text.getvalue())
+        record["profile"] = str(out_dir / f"{name}.prof")
+
+    (out_dir / f"{name}.json").write_text(json.dumps(record, indent=2))
+    return record
+
+
+def write_report(run_id: str, extra: Optional[dict] = None) -> Path:
+    """Collect every record of a run into output/perf/run-<run id>.json."""
+    records = [json.loads(p.read_text()) for p in sorted(run_dir(run_id).glob("*.json"))]
+    report = {"run_id": run_id, **(extra or {}), "records": records}
+    path = PERF_DIR / f"run-{run_id}.json"
+    path.write_text(json.dumps(report, indent=2))
+    return path
+
+
+def print_summary(records: List[dict]) -> None:
+    print(f"\n{'name':<24}{'status':<8}{'wall s':>9}{'cpu s':>9}{'rss MB':>9}{'read MB':>10}{'write MB':>10}")
+    for r in records:
+        read = (r["bytes_read"] or 0) / 2**20
+        written = (r["bytes_written"] or 0) / 2**20
+        print(f"{r['name']:<24}{r['status']:<8}{r['wall_s']:>9.1f}{r['cpu_s'] + r['children_cpu_s']:>9.1f}"
+              f"{max(r['peak_rss_mb'], r['children_peak_rss_mb']):>9.0f}{read:>10.1f}{written:>10.1f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run scripts with a performance record.")
+    parser.add_argument("scripts", nargs="+", type=Path)
+    parser.add_argument("--name", help="record name (single script; default: file stem)")
+    parser.add_argument("--run-id", default=os.environ.get(RUN_ID_ENV))
+    parser.add_argument("--profile", help="comma-separated names to profile (default: $DMP_PROFILE)")
+    parser.add_argument("--profiler", choices=["cprofile", "sample"],
+                        default=os.environ.get(PROFILER_ENV, "cprofile"))
+    parser.add_argument("--no-report", action="store_true", help="only write the per-script record")
+    args = parser.parse_args(argv)
+
+    run_id = args.run_id or new_run_id()
+    profiled = profiled_names(args.profile)
+
+    if len(args.scripts) == 1:
+        script = args.scripts[0]
+        name = args.name or script.stem
+        record = instrument(script, name, run_dir(run_id), profile=name in profiled, profiler=args.profiler)
+        records = [record]
+    else:
+        # Each script gets a fresh interpreter (the two code folders both have a config module)
+        env = {**os.environ, PROFILE_ENV: ",".join(profiled), PROFILER_ENV: args.profiler}
+        for script in args.scripts:
+            subprocess.run([sys.executable, __file__, "--run-id", run_id, "--no-report", str(script)], env=env)
+        records = [json.loads((run_dir(run_id) / f"{s.stem}.json").read_text()) for s in args.scripts]
+
+    if not args.no_report:
+        print_summary(records)
+        print(f"\nRun report: {write_report(run_id)}")
+    return 0 if all(r["status"] == "ok" for r in records) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+"""
+Tests for the cleaning modules import them the way the stage scripts do,
+as flat modules from code/01_cleaning. 02_analysis has a config module of its
+own, so any config already imported from there is dropped first.
+"""
+
+import sys
+from pathlib import Path
+
+FOLDER = str(Path(__file__).resolve().parents[2] / "01_cleaning")
+
+sys.modules.pop("config", None)
+if FOLDER in sys.path:
+    sys.path.remove(FOLDER)
+sys.path.insert(0, FOLDER)
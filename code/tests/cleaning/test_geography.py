@@ -0,0 +1,36 @@
+"""
+geography.py: state and county key conversions and CoC codes.
+"""
+
+import pandas as pd
+
+from geography import (coc_categorical, coc_state_code, county_fips, county_fips_from_geoid, county_part,
+                       county_state, fips5, is_territory, state_code, state_code_from_name,
+                       state_fips_from_code, state_fips_from_name, state_name)
+
+
+def test_state_names_codes_and_fips():
+    names = ["Alabama", " Wyoming ", "Washington, DC", "U.S. Virgin Islands", "United States"]
+    assert state_fips_from_name(names).tolist() == [1, 56, 11, 78, pd.NA]
+    assert state_code_from_name(names).tolist()[:4] == ["AL", "WY", "DC", "VI"]
+    assert state_fips_from_code(["CA", "PR"]).tolist() == [6, 72]
+    assert state_code([1, "06", "72"]).tolist() == ["AL", "CA", "PR"]
+    assert state_name([36]).tolist() == ["New York"]
+    assert is_territory([72, 78, 11]).tolist() == [True, True, False]
+
+
+def test_county_keys():
+    fips = county_fips([1, 56], [1, 45])
+    assert fips.tolist() == [1001, 56045]
+    assert county_fips_from_geoid(["01001", "56045"]).tolist() == [1001, 56045]
+    assert county_state(fips).tolist() == [1, 56]
+    assert county_part(fips).tolist() == [1, 45]
+    assert fips5(fips).tolist() == ["01001", "56045"]
+
+
+def test_coc_codes():
+    codes = coc_categorical(["NY-600", " AL-500", "NY-600", None])
+    assert list(codes.cat.categories) == ["AL-500", "NY-600"]
+    assert coc_state_code(codes).tolist()[:3] == ["NY", "AL", "NY"]
+    assert pd.isna(coc_state_code(codes).iloc[3])
+    assert coc_state_code(["CA-600"]).tolist() == ["CA"]
@@ -0,0 +1,70 @@
+"""
+hud.py: the streamed year sheets against pd.read_excel, including a workbook
+whose stored sheet dimensions are stale.
+"""
+
+import re
+import zipfile
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from hud import RENAME, read_sheet, read_sheet_rows, year_sheets
+
+HEADER = list(RENAME) + ["Unused"]
+ROWS = {2016: 5, 2017: 7}
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    """Cover sheet plus one sheet per year: title row, header row, then CoCs
+    with a blank spacer row in the middle."""
+    wb = Workbook()
+    wb.active.title = "Notes"
+    for year, n in ROWS.items():
+        ws = wb.create_sheet(str(year))
+        ws.append([f"System Performance Measures {year}"])
+        ws.append(HEADER)
+        for i in range(n):
+            if i == 2:
+                ws.append([None] * len(HEADER))
+            ws.append([f"CoC {i}", f"NY-{500 + i}"] + [float(i)] * (len(HEADER) - 2))
+    path = tmp_path / "HUD.xlsx"
+    wb.save(path)
+    return path
+
+
+def stale_dimensions(path):
+    """Rewrite every sheet's <dimension> tag to cover only the first two rows."""
+    out = path.with_name("stale.xlsx")
+    with zipfile.ZipFile(path) as src, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            data = src.read(item.filename)
+            if item.filename.startswith("xl/worksheets/sheet"):
+                data = re.sub(rb'<dimension ref="[^"]*"', b'<dimension ref="A1:K2"', data)
+            dst.writestr(item, data)
+    return out
+
+
+def pandas_counts(path):
+    sheets = year_sheets(pd.ExcelFile(path).sheet_names)
+    return {year: len(pd.read_excel(path, sheet_name=sheet, header=1).dropna(how="all"))
+            for year, sheet in sheets.items()}
+
+
+@pytest.mark.parametrize("stale", [False, True], ids=["fresh", "stale"])
+def test_rows_per_year_match_read_excel(workbook, stale):
+    path = stale_dimensions(workbook) if stale else workbook
+    counts = {year: len(read_sheet(path, str(year), year)) for year in ROWS}
+    assert counts == pandas_counts(path) == ROWS
+
+
+def test_columns_follow_rename(workbook):
+    wb = load_workbook(workbook, read_only=True, data_only=True)
+    try:
+        df = read_sheet_rows(wb["2017"], 2017)
+    finally:
+        wb.close()
+    assert list(df.columns) == list(RENAME.values()) + ["year"]
+    assert df["coc_code"].tolist()[:2] == ["NY-500", "NY-501"]
@@ -0,0 +1,80 @@
+"""
+policy_cube.py: the bit-packed daily status against the interval day counts
+it is built from, and its save/open round trip.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from policy_cube import PolicyCube, daily_status
+from policy_intervals import merge_intervals, period_exposure
+
+START = pd.Timestamp("2020-01-01")
+END = pd.Timestamp("2021-12-31")
+STATES = ["CA", "NY", "TX"]
+POLICIES = ["evict", "utility"]
+
+
+@pytest.fixture
+def intervals():
+    rows = [
+        ("CA", "evict", "2020-03-19", "2020-09-30"),
+        ("CA", "evict", "2021-01-01", "2021-01-31"),
+        ("NY", "evict", "2020-03-20", "2021-12-31"),
+        ("NY", "utility", "2020-02-29", "2020-02-29"),
+        ("XX", "evict", "2020-01-01", "2020-12-31"),   # not in STATES: ignored
+    ]
+    iv = pd.DataFrame(rows, columns=["state_code", "policy", "start", "end"])
+    iv[["start", "end"]] = iv[["start", "end"]].apply(pd.to_datetime)
+    return merge_intervals(iv, ["state_code", "policy"])
+
+
+@pytest.fixture
+def cube(intervals):
+    return PolicyCube.build(intervals, STATES, POLICIES, START, END)
+
+
+def test_daily_status_marks_interval_days(intervals):
+    status = daily_status(intervals, STATES, POLICIES, START, END)
+    assert status.shape == (3, 2, (END - START).days + 1)
+    assert status[0, 0].sum() == 196 + 31
+    assert status[1, 1].sum() == 1 and status[1, 1, 59]
+    assert not status[2].any()
+
+
+def test_window_sums_match_period_exposure(intervals, cube):
+    months = period_exposure(intervals[intervals["state_code"].isin(STATES)], "M", START, END)
+    for row in months.itertuples(index=False):
+        period = pd.Period(row.period, "M")
+        days = cube.window_sum(row.policy, period.start_time, period.end_time.normalize(), [row.state_code])
+        assert days.iloc[0] == row.days
+
+
+def test_window_sum_outside_the_cube_counts_nothing(cube):
+    assert cube.window_sum("evict", "2019-01-01", "2019-12-31").tolist() == [0, 0, 0]
+    assert cube.window_sum("evict", "2021-12-01", "2022-06-30").tolist() == [0, 31, 0]
+
+
+def test_lagged_sums_match_a_direct_count(cube):
+    dates = pd.to_datetime(["2020-04-15", "2020-10-15", "2021-01-10"])
+    out = cube.lagged_sums("evict", dates, window=30, lag=7)
+    status = cube.status("evict")
+    for j, date in enumerate(dates):
+        last = cube.day(date) - 7
+        np.testing.assert_array_equal(out.iloc[:, j].to_numpy(), status[:, last - 29:last + 1].sum(axis=1))
+
+
+def test_unknown_state_is_an_error(cube):
+    with pytest.raises(KeyError):
+        cube.window_sum("evict", START, END, ["ZZ"])
+
+
+def test_save_and_open_round_trip(cube, tmp_path):
+    path = tmp_path / "policy_cube.npy"
+    cube.save(path)
+    back = PolicyCube.open(path)
+    assert list(back.states) == STATES and back.policies == POLICIES
+    assert back.start == cube.start and back.n_days == cube.n_days
+    np.testing.assert_array_equal(back.status("evict"), cube.status("evict"))
+    np.testing.assert_array_equal(back.status("utility"), cube.status("utility"))
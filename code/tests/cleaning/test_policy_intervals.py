@@ -0,0 +1,160 @@
+"""
+policy_intervals.py: interval merging, clipping to the study window and
+period day counts, checked against a plain day-by-day count.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from policy_intervals import merge_intervals, parse_us_dates, period_exposure, policy_intervals
+
+START = pd.Timestamp("2020-01-01")
+END = pd.Timestamp("2023-12-31")
+
+
+def intervals(*rows, by=("state_code", "policy")):
+    return pd.DataFrame(
+        [(*keys, pd.Timestamp(s), pd.Timestamp(e)) for *keys, s, e in rows],
+        columns=[*by, "start", "end"],
+    )
+
+
+def dates(*values, name=None):
+    return pd.Series([pd.Timestamp(v) if v else pd.NaT for v in values], dtype="datetime64[ns]", name=name)
+
+
+def daily_counts(iv, freq, start=START, end=END):
+    """Reference: days active per (state, policy, period) from an explicit day grid."""
+    rows = []
+    for r in iv.itertuples(index=False):
+        for day in pd.date_range(max(r.start, start), min(r.end, end), freq="D"):
+            rows.append((r.state_code, r.policy, day.to_period(freq), day))
+    days = pd.DataFrame(rows, columns=["state_code", "policy", "period", "day"]).drop_duplicates()
+    return days.groupby(["state_code", "policy", "period"], as_index=False).agg(
+        days=("day", "size"), first_active=("day", "min"), last_active=("day", "max"))
+
+
+# ------------------------------------------------------------
+# merge_intervals
+# ------------------------------------------------------------
+
+def test_overlapping_and_adjacent_intervals_merge():
+    iv = intervals(
+        ("CA", "evict", "2020-03-01", "2020-05-31"),
+        ("CA", "evict", "2020-05-15", "2020-06-30"),   # overlaps
+        ("CA", "evict", "2020-07-01", "2020-07-31"),   # starts the day after
+        ("CA", "evict", "2020-09-01", "2020-09-30"),   # after a gap
+    )
+    out = merge_intervals(iv, ["state_code", "policy"])
+    assert out[["start", "end"]].astype(str).values.tolist() == [
+        ["2020-03-01", "2020-07-31"],
+        ["2020-09-01", "2020-09-30"],
+    ]
+
+
+def test_one_day_gap_is_not_merged():
+    iv = intervals(("NY", "evict", "2020-03-01", "2020-03-10"), ("NY", "evict", "2020-03-12", "2020-03-20"))
+    assert len(merge_intervals(iv, ["state_code", "policy"])) == 2
+
+
+def test_nested_and_unsorted_intervals():
+    iv = intervals(
+        ("TX", "utility", "2021-02-01", "2021-02-10"),
+        ("TX", "utility", "2021-01-01", "2021-12-31"),   # contains the others
+        ("TX", "utility", "2021-06-01", "2021-06-30"),
+    )
+    out = merge_intervals(iv, ["state_code", "policy"])
+    assert out[["start", "end"]].astype(str).values.tolist() == [["2021-01-01", "2021-12-31"]]
+
+
+def test_groups_are_merged_separately():
+    iv = intervals(
+        ("CA", "evict", "2020-03-01", "2020-06-30"),
+        ("CA", "utility", "2020-04-01", "2020-08-31"),
+        ("NY", "evict", "2020-05-01", "2020-07-31"),
+    )
+    out = merge_intervals(iv, ["state_code", "policy"])
+    assert len(out) == 3
+    assert set(zip(out["state_code"], out["policy"])) == {("CA", "evict"), ("CA", "utility"), ("NY", "evict")}
+
+
+# ------------------------------------------------------------
+# policy_intervals
+# ------------------------------------------------------------
+
+def test_policy_intervals_clips_and_fills_to_the_window():
+    df = pd.DataFrame({
+        "state_code": ["CA", "NY", "TX", "WA"],
+        "s": dates("2019-06-01", "2021-03-15 12:00", None, "2024-02-01"),
+        "e": dates("2020-04-30", None, "2021-01-01", "2024-03-01"),
+    })
+    out = policy_intervals(df, {"evict": ("s", "e")}, START, END)
+
+    # Starts before the window are clipped; a mid-day start counts from the next day;
+    # a missing end runs to the window's end; no start, or entirely outside, is dropped
+    assert out[["state_code", "start", "end"]].astype(str).values.tolist() == [
+        ["CA", "2020-01-01", "2020-04-30"],
+        ["NY", "2021-03-16", "2023-12-31"],
+    ]
+
+
+def test_policy_intervals_merges_repeated_rows():
+    df = pd.DataFrame({
+        "state_code": ["CA", "CA"],
+        "s": dates("2020-03-01", "2020-04-01"),
+        "e": dates("2020-04-15", "2020-06-30"),
+        "s2": dates("2020-05-01", None),
+        "e2": dates("2020-05-31", None),
+    })
+    out = policy_intervals(df, {"evict": ("s", "e"), "utility": ("s2", "e2")}, START, END)
+    assert out[["policy", "start", "end"]].astype(str).values.tolist() == [
+        ["evict", "2020-03-01", "2020-06-30"],
+        ["utility", "2020-05-01", "2020-05-31"],
+    ]
+
+
+# ------------------------------------------------------------
+# period_exposure
+# ------------------------------------------------------------
+
+@pytest.mark.parametrize("freq", ["Y", "Q", "M"])
+def test_period_exposure_matches_a_daily_count(freq):
+    iv = merge_intervals(intervals(
+        ("CA", "evict", "2020-03-19", "2021-09-30"),
+        ("CA", "evict", "2022-12-31", "2023-01-01"),   # one day each side of a year boundary
+        ("NY", "evict", "2020-03-20", "2022-01-15"),
+        ("NY", "utility", "2020-02-29", "2020-02-29"),  # a single (leap) day
+        ("TX", "evict", "2020-01-01", "2023-12-31"),   # the whole window
+    ), ["state_code", "policy"])
+    out = period_exposure(iv, freq, START, END)
+    expected = daily_counts(iv, freq)
+
+    keys = ["state_code", "policy", "period"]
+    out = out.sort_values(keys).reset_index(drop=True)
+    expected = expected.sort_values(keys).reset_index(drop=True)
+    assert out[keys].astype(str).values.tolist() == expected[keys].astype(str).values.tolist()
+    np.testing.assert_array_equal(out["days"], expected["days"])
+    np.testing.assert_array_equal(out["first_active"].to_numpy(), expected["first_active"].to_numpy())
+    np.testing.assert_array_equal(out["last_active"].to_numpy(), expected["last_active"].to_numpy())
+
+
+def test_period_exposure_days_add_up_to_interval_lengths():
+    iv = intervals(("CA", "evict", "2020-03-19", "2021-09-30"), ("NY", "evict", "2020-01-01", "2023-12-31"))
+    out = period_exposure(iv, "M", START, END)
+    totals = out.groupby("state_code")["days"].sum()
+    assert totals.to_dict() == {"CA": 561, "NY": 1461}
+
+
+# ------------------------------------------------------------
+# parse_us_dates
+# ------------------------------------------------------------
+
+def test_parse_us_dates_formats():
+    values = pd.DataFrame({
+        "a": ["03/19/2020", "3/1/21", pd.Timestamp("2020-07-04"), None],
+        "b": ["March 4, 2021", "not a date", "  04/30/2020 ", ""],
+    })
+    out = parse_us_dates(values)
+    pd.testing.assert_series_equal(out["a"], dates("2020-03-19", "2021-03-01", "2020-07-04", None, name="a"))
+    pd.testing.assert_series_equal(out["b"], dates("2021-03-04", None, "2020-04-30", None, name="b"))